@@ -1,17 +1,18 @@
 import os
 
 import django
-from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
-from videoSharing.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoProject.settings')
-
 django.setup()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from videoSharing.middleware import JWTAuthMiddleware  # noqa: E402
+from videoSharing.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(  # or AuthMiddlewareStack
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             websocket_urlpatterns
         )
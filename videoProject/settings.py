@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'videoSharing.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,12 +84,59 @@ ASGI_APPLICATION = 'videoProject.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE selects the profile: 'sqlite' (default, single node/dev)
+# or 'postgresql' (production, using Django's psycopg connection pool).
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'videoproject'),
+            'USER': os.environ.get('POSTGRES_USER', 'videoproject'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('POSTGRES_POOL', '1') == '1':
+        # The pool owns connection lifetime, so persistent connections must
+        # stay disabled (CONN_MAX_AGE = 0).
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 20)),
+                'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE', 60))
+else:
+    # WAL lets readers proceed while a writer commits; writers wait up to
+    # busy_timeout ms for the lock instead of failing with "database is
+    # locked", and IMMEDIATE transactions take the write lock up front so
+    # that wait happens at BEGIN rather than as a deadlock mid-transaction.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=5000;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -172,3 +221,161 @@ CACHES = {
         }
     }
 }
+
+# Cached video list/detail responses are keyed on per-video and catalog
+# version counters, so writes invalidate them by bumping a version rather
+# than deleting keys. While one worker rebuilds a missing entry, others wait
+# up to LOCK_TIMEOUT seconds for it instead of all hitting the database.
+RESPONSE_CACHE = {
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'POLL_INTERVAL': 0.05,
+}
+
+
+# Views are buffered per video and written back in bulk every FLUSH_INTERVAL
+# seconds. Use the 'redis' backend when running more than one worker.
+VIEW_COUNTER = {
+    'BACKEND': 'memory',
+    'FLUSH_INTERVAL': 5,
+}
+
+# import_videos writes CHUNK_SIZE rows per transaction; POST /video/batch/
+# accepts at most MAX_BATCH videos per request.
+VIDEO_IMPORT = {
+    'CHUNK_SIZE': 2000,
+    'MAX_BATCH': 1000,
+}
+
+# Exports at /api/export/<dataset>/ and from export_data read and send
+# CHUNK_SIZE rows at a time.
+EXPORTS = {
+    'CHUNK_SIZE': 5000,
+}
+
+# Trending rankings count views in BUCKET_SECONDS buckets and rank videos
+# over each of WINDOWS (name: seconds). Flushed view counts feed them, so
+# they lag by at most VIEW_COUNTER['FLUSH_INTERVAL']. The 'redis' backend
+# keeps one incrementally maintained sorted set per window; the 'database'
+# backend sums VideoViewBucket rows and caches each ranking briefly.
+TRENDING = {
+    'BACKEND': 'database',
+    'BUCKET_SECONDS': 300,
+    'WINDOWS': {'1h': 60 * 60, '24h': 24 * 60 * 60, '7d': 7 * 24 * 60 * 60},
+    'DEFAULT_WINDOW': '24h',
+    'DEFAULT_LIMIT': 20,
+    'MAX_LIMIT': 100,
+}
+
+# Per-video view analytics served from hourly and daily buckets that the view
+# counter flush fills. DEFAULT_RANGE applies when a request gives no start;
+# a request may span at most MAX_BUCKETS buckets. compact_watch_history drops
+# hourly buckets after HOURLY_RETENTION_DAYS; daily buckets are kept.
+VIEW_ANALYTICS = {
+    'DEFAULT_RANGE': {'hour': timedelta(days=2), 'day': timedelta(days=30)},
+    'MAX_BUCKETS': 2000,
+    'HOURLY_RETENTION_DAYS': 90,
+}
+
+# Inbound websocket messages need a token from their connection's bucket and
+# from the user's bucket per consumer, each (messages per second, burst) or
+# None for no limit; the 'redis' backend shares user buckets between
+# workers. Up to MAX_QUEUE accepted messages wait per connection. Messages
+# over a limit are dropped with one error notice (ON_LIMIT 'drop', closing
+# after CLOSE_AFTER_DROPS drops in a row, 0 for never) or close the socket
+# (ON_LIMIT 'close'), with close code 4029.
+WEBSOCKET_RATE_LIMIT = {
+    'BACKEND': 'memory',
+    'CONNECTION': (5, 10),
+    'USER': (10, 20),
+    'MAX_QUEUE': 32,
+    'ON_LIMIT': 'drop',
+    'CLOSE_AFTER_DROPS': 100,
+}
+
+# Minimum number of seconds between two view_count broadcasts to a video group.
+VIEW_BROADCAST_INTERVAL = 0.25
+
+PAGINATION = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+}
+
+# Number of latest comments embedded in a video's detail response; the full
+# collection lives under /video/{id}/comments/. Watch history is only served
+# under /video/{id}/history/, so watching a video does not invalidate its
+# cached detail.
+VIDEO_DETAIL_PREVIEW_SIZE = 5
+
+# Watch events are queued and upserted into WatchHistory in batches by a
+# background flusher. Use the 'redis' backend to share one queue between
+# workers. Once MAX_QUEUE_SIZE events are waiting, OVERFLOW 'drop' discards
+# new events (counted in watch_events_dropped_total), 'raise' fails the
+# request and 'flush' writes a batch on the request thread.
+WATCH_HISTORY_PIPELINE = {
+    'BACKEND': 'memory',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2,
+    'MAX_QUEUE_SIZE': 50000,
+    'OVERFLOW': 'drop',
+    'FLUSH_ON_EXIT': True,
+}
+
+# compact_watch_history deletes WatchHistory rows last watched more than DAYS
+# days ago, BATCH_SIZE rows per transaction with PAUSE seconds in between;
+# with --loop it repeats every INTERVAL seconds. Daily per-video and per-user
+# totals are kept in VideoDailyStats and UserDailyStats.
+WATCH_HISTORY_RETENTION = {
+    'DAYS': 180,
+    'BATCH_SIZE': 1000,
+    'PAUSE': 0.1,
+    'INTERVAL': 60 * 60,
+}
+
+# Payments are queued by the API and charged by process_payments through
+# PROCESSOR (built with PROCESSOR_OPTIONS). A worker leases BATCH_SIZE
+# payments for LEASE_SECONDS; gateway errors are retried after
+# RETRY_BACKOFF seconds, doubling each time, up to MAX_ATTEMPTS.
+PAYMENTS = {
+    'PROCESSOR': 'videoSharing.payment_processor.FakePaymentGateway',
+    'PROCESSOR_OPTIONS': {},
+    'BATCH_SIZE': 50,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 5,
+    'POLL_INTERVAL': 1,
+}
+
+# expire_subscriptions deactivates subscriptions past their end date,
+# BATCH_SIZE per transaction with PAUSE seconds in between; with --loop it
+# repeats every INTERVAL seconds.
+SUBSCRIPTION_EXPIRY = {
+    'BATCH_SIZE': 1000,
+    'PAUSE': 0,
+    'INTERVAL': 60,
+}
+
+# "Viewers also watched": build_related_videos rebuilds the TOP_K neighbors
+# of every video from WatchHistory, and first watches add to the shared
+# viewer counts in between (INCREMENTAL) by pairing the new video with the
+# user's INCREMENTAL_HISTORY latest ones. Neighbors with fewer than
+# MIN_SHARED shared viewers are not served.
+RELATED_VIDEOS = {
+    'TOP_K': 20,
+    'MIN_SHARED': 2,
+    'DEFAULT_LIMIT': 10,
+    'INCREMENTAL': True,
+    'INCREMENTAL_HISTORY': 50,
+}
+
+# Seconds a user's premium entitlement stays cached. Subscription changes
+# invalidate it immediately, so this only bounds staleness after an expiry
+# that nothing has written yet.
+ENTITLEMENT_CACHE_TIMEOUT = 300
+
+# Request, websocket and channel layer metrics are served at /metrics in the
+# Prometheus text format, one registry per worker process. Only clients in
+# ALLOWED_IPS may scrape it; an empty list turns the endpoint off.
+METRICS = {
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
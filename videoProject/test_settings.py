@@ -0,0 +1,19 @@
+"""
+Settings for the test suite, which must not depend on a running Redis server:
+
+    python manage.py test --settings=videoProject.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
@@ -0,0 +1,68 @@
+import math
+import time
+
+from .models import Video, VideoViewBucket
+from .rollups import bucket_start, from_epoch, increment_counters
+
+GRANULARITIES = {
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+}
+
+
+def record_view_series(counts, now=None):
+    """Add ``{video_id: views}`` to the current hourly and daily bucket of each video.
+
+    Called from the view counter flush inside its transaction, so buckets
+    and ``Video.view_count`` always move together.
+    """
+    now = time.time() if now is None else now
+    existing = set(Video.objects.filter(pk__in=counts).values_list('pk', flat=True))
+    increments = {}
+    for granularity, seconds in GRANULARITIES.items():
+        start = from_epoch(bucket_start(now, seconds))
+        for video_id, views in counts.items():
+            if views and video_id in existing:
+                increments[(video_id, granularity, start)] = {'views': views}
+    increment_counters(VideoViewBucket, ('video_id', 'granularity', 'bucket_start'), increments)
+
+
+def bucket_count(granularity, start, end):
+    seconds = GRANULARITIES[granularity]
+    return max(0, math.ceil((end.timestamp() - bucket_start(start.timestamp(), seconds)) / seconds))
+
+
+def view_series(video_id, granularity, start, end, points=None):
+    """Return ``[(bucket_start, views), ...]`` for every bucket between ``start`` and ``end``.
+
+    Buckets without views are filled with zeros. With ``points``, runs of
+    adjacent buckets are summed so at most ``points`` values come back.
+    """
+    seconds = GRANULARITIES[granularity]
+    first = bucket_start(start.timestamp(), seconds)
+    stored = dict(VideoViewBucket.objects.filter(
+        video_id=video_id, granularity=granularity, bucket_start__gte=from_epoch(first), bucket_start__lt=end,
+    ).values_list('bucket_start', 'views'))
+
+    series = []
+    for index in range(bucket_count(granularity, start, end)):
+        moment = from_epoch(first + index * seconds)
+        series.append((moment, stored.get(moment, 0)))
+
+    if points and points < len(series):
+        size = math.ceil(len(series) / points)
+        series = [(series[i][0], sum(views for _, views in series[i:i + size]))
+                  for i in range(0, len(series), size)]
+    return series
+
+
+def prune_view_series(granularity, cutoff, batch_size=1000):
+    """Delete ``granularity`` buckets that start before ``cutoff``, ``batch_size`` at a time."""
+    deleted = 0
+    while True:
+        ids = list(VideoViewBucket.objects.filter(granularity=granularity, bucket_start__lt=cutoff)
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        count, _ = VideoViewBucket.objects.filter(pk__in=ids).delete()
+        deleted += count
@@ -0,0 +1,157 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views import View
+
+from .exports import DATASETS, FORMATS, export_queryset, parse_moment, stream_export
+from .middleware import get_user_for_token
+from .models import Comment, Payment, Subscription, Video
+from .serializers import CommentSerializer, PaymentSerializer, SubscriptionSerializer, VideoSerializer
+from .views import count_per_video
+from .watch_events import record_watch
+
+# Async counterparts of the hot read endpoints. They run on the ASGI event
+# loop and use the async ORM, so a request waiting on the database does not
+# hold one of the sync_to_async worker threads the DRF views run in. The
+# exports are here too, since only an async view can stream without
+# buffering the whole response under ASGI.
+
+
+async def authenticate(request):
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return AnonymousUser()
+    return await get_user_for_token(parts[1])
+
+
+def encode_cursor(timestamp, pk):
+    return base64.urlsafe_b64encode(json.dumps([timestamp.isoformat(), pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse_datetime(timestamp), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', settings.PAGINATION['PAGE_SIZE']))
+    except ValueError:
+        page_size = settings.PAGINATION['PAGE_SIZE']
+    return max(1, min(page_size, settings.PAGINATION['MAX_PAGE_SIZE']))
+
+
+async def keyset_page(request, queryset, timestamp_field, serializer_class):
+    """Return a newest-first page of ``queryset`` seeking on ``(timestamp_field, id)``."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None or position[0] is None:
+            return JsonResponse({'detail': 'Invalid cursor'}, status=404)
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{timestamp_field}__lt': timestamp}) | Q(**{timestamp_field: timestamp, 'id__lt': pk})
+        )
+
+    page_size = get_page_size(request)
+    rows = [row async for row in queryset.order_by(f'-{timestamp_field}', '-id')[:page_size + 1]]
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor(getattr(rows[-1], timestamp_field), rows[-1].pk)
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return JsonResponse({'next': next_url, 'results': serializer_class(rows, many=True).data})
+
+
+class AsyncVideoListView(View):
+    async def get(self, request):
+        return await keyset_page(request, Video.objects.all(), 'upload_date', VideoSerializer)
+
+
+class AsyncVideoDetailView(View):
+    async def get(self, request, pk):
+        try:
+            video = await Video.objects.annotate(
+                comment_count=count_per_video(Comment),
+            ).aget(pk=pk)
+        except Video.DoesNotExist:
+            return JsonResponse({'detail': 'No Video matches the given query.'}, status=404)
+
+        preview_size = settings.VIDEO_DETAIL_PREVIEW_SIZE
+        comments = [c async for c in Comment.objects.filter(video=video).order_by('-created_at', '-id')[:preview_size]]
+
+        user = await authenticate(request)
+        if user.is_authenticated:
+            await sync_to_async(record_watch)(user.pk, video.pk)
+
+        data = VideoSerializer(video).data
+        data.update({
+            'comment_count': video.comment_count,
+            'comments': CommentSerializer(comments, many=True).data,
+        })
+        return JsonResponse(data)
+
+
+class AsyncCheckSubscriptionStatusView(View):
+    async def get(self, request):
+        user = await authenticate(request)
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        try:
+            subscription = await Subscription.objects.aget(user=user)
+        except Subscription.DoesNotExist:
+            return JsonResponse({'error': 'Subscription not found.'}, status=404)
+        return JsonResponse(SubscriptionSerializer(subscription).data)
+
+
+class AsyncPaymentHistoryView(View):
+    async def get(self, request):
+        user = await authenticate(request)
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        return await keyset_page(request, Payment.objects.filter(user=user), 'created_at', PaymentSerializer)
+
+
+class ExportView(View):
+    """Stream every row of a dataset as NDJSON or CSV; staff only.
+
+    Filters: ``start`` and ``end`` (ISO 8601, end exclusive) and ``user`` (id).
+    """
+
+    async def get(self, request, dataset):
+        user = await authenticate(request)
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        if not user.is_staff:
+            return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+        if dataset not in DATASETS:
+            return JsonResponse({'detail': f'Unknown dataset. Choose from: {", ".join(DATASETS)}.'}, status=404)
+
+        file_format = request.GET.get('format', 'ndjson')
+        if file_format not in FORMATS:
+            return JsonResponse({'detail': f'format must be one of: {", ".join(FORMATS)}.'}, status=400)
+        try:
+            start = parse_moment(request.GET.get('start'))
+            end = parse_moment(request.GET.get('end'))
+            user_id = int(request.GET['user']) if request.GET.get('user') else None
+        except ValueError:
+            return JsonResponse({'detail': 'start and end must be ISO 8601 dates and user an integer.'}, status=400)
+
+        queryset = export_queryset(dataset, start, end, user_id)
+        response = StreamingHttpResponse(
+            stream_export(dataset, queryset, file_format, settings.EXPORTS['CHUNK_SIZE']),
+            content_type=FORMATS[file_format][0],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+        return response
@@ -0,0 +1,53 @@
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Run ``func`` every ``interval`` seconds on a daemon thread.
+
+    The thread is started lazily by ``ensure_started`` so that importing a
+    module never spawns threads, and ``func`` is run one last time at
+    interpreter exit so buffered work is not lost on shutdown.
+    """
+
+    def __init__(self, func, interval, name=None, flush_on_exit=True):
+        self.func = func
+        self.interval = interval
+        self.name = name or func.__name__
+        self.flush_on_exit = flush_on_exit
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+            if self.flush_on_exit:
+                atexit.register(self.stop)
+
+    def stop(self, flush=True):
+        self._stopped.set()
+        if flush:
+            self.run_once()
+
+    def run_once(self):
+        try:
+            self.func()
+        except Exception:
+            logger.exception('Periodic task %s failed', self.name)
+        finally:
+            close_old_connections()
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .middleware import JWTAuthMiddleware
+from .models import Comment, Subscription, User, Video
+from .routing import websocket_urlpatterns
+from .view_counter import flush_view_counts
+from .watch_events import watch_history_pipeline
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed, errors, operations=None):
+    operations = len(latencies) if operations is None else operations
+    return {
+        'operations': operations + errors,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_ops': round(operations / elapsed, 2) if elapsed else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts queries and their time on any thread."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.count += 1
+                self.seconds += elapsed
+
+    @contextmanager
+    def installed(self):
+        """Count queries on this thread's connection and on every connection opened meanwhile."""
+        # connection_created fires again on every reconnect of the same
+        # connection object, so install once and uninstall on the way out.
+        installed = []
+
+        def install(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+                installed.append(connection)
+
+        connection_created.connect(install)
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+        finally:
+            connection_created.disconnect(install)
+            for other in installed:
+                if self in other.execute_wrappers:
+                    other.execute_wrappers.remove(self)
+
+    def as_dict(self, operations):
+        return {
+            'db_queries': self.count,
+            'db_time_ms': round(self.seconds * 1000, 3),
+            'db_queries_per_op': round(self.count / operations, 3) if operations else None,
+        }
+
+
+async def drive(operation, total, concurrency):
+    """Run ``operation(i)`` ``total`` times with at most ``concurrency`` in flight.
+
+    ``operation`` returns a truthy value on success; exceptions and falsy
+    results count as errors and are left out of the latency figures.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def run(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await operation(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(total)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def drive_threads(operation, total, concurrency):
+    """Like ``drive`` but for blocking ``operation(i)`` calls, one OS thread per slot.
+
+    Every thread uses its own database connection, which is what exposes
+    lock contention between concurrent readers and writers.
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+    errors = 0
+
+    def worker():
+        nonlocal errors
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    ok = operation(i)
+                except Exception:
+                    ok = False
+                with lock:
+                    if ok:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def seed(videos=200, comments_per_video=5):
+    user = User.objects.create_user('bench@example.com', 'bench', 'bench-password')
+    Subscription.objects.create(user=user, subscription_type='premium')
+    Video.objects.bulk_create(
+        Video(title=f'Video {i}', description=f'Benchmark video {i}', url=f'https://example.com/{i}',
+              is_premium=False)
+        for i in range(videos)
+    )
+    video_ids = list(Video.objects.values_list('pk', flat=True))
+    Comment.objects.bulk_create(
+        Comment(user=user, video_id=video_id, content=f'Comment {j}')
+        for video_id in video_ids for j in range(comments_per_video)
+    )
+    return {'user': user, 'token': str(AccessToken.for_user(user)), 'video_ids': video_ids}
+
+
+def flush_buffers():
+    """Write back buffered views and watch events so their queries are counted."""
+    flush_view_counts()
+    watch_history_pipeline.flush()
+
+
+def _auth(data):
+    return {'Authorization': f'Bearer {data["token"]}'}
+
+
+def _get(path, headers=None):
+    client = AsyncClient()
+
+    async def operation(i):
+        response = await client.get(path(i) if callable(path) else path, headers=headers)
+        return response.status_code == 200
+    return operation
+
+
+@scenario('catalog_sync')
+async def catalog_sync(data, total, concurrency):
+    return await drive(_get('/api/video/'), total, concurrency)
+
+
+@scenario('catalog_async')
+async def catalog_async(data, total, concurrency):
+    return await drive(_get('/api/async/video/'), total, concurrency)
+
+
+@scenario('catalog_browse')
+async def catalog_browse(data, total, concurrency, pages=3):
+    """Each operation opens the catalog and follows ``next`` for ``pages`` pages."""
+    client = AsyncClient()
+
+    async def operation(i):
+        path = '/api/video/?page_size=20'
+        for _ in range(pages):
+            response = await client.get(path)
+            if response.status_code != 200:
+                return False
+            path = response.json()['next']
+            if not path:
+                break
+        return True
+
+    return await drive(operation, total, concurrency)
+
+
+@scenario('detail_sync')
+async def detail_sync(data, total, concurrency):
+    video_ids = data['video_ids']
+    result = await drive(_get(lambda i: f'/api/video/{video_ids[i % len(video_ids)]}/', _auth(data)),
+                         total, concurrency)
+    await sync_to_async(flush_buffers)()
+    return result
+
+
+@scenario('detail_async')
+async def detail_async(data, total, concurrency):
+    video_ids = data['video_ids']
+    result = await drive(_get(lambda i: f'/api/async/video/{video_ids[i % len(video_ids)]}/', _auth(data)),
+                         total, concurrency)
+    await sync_to_async(flush_buffers)()
+    return result
+
+
+@scenario('payments')
+async def payments(data, total, concurrency):
+    client = AsyncClient()
+    run = uuid.uuid4().hex
+
+    async def operation(i):
+        headers = {**_auth(data), 'Idempotency-Key': f'benchmark-{run}-{i}'}
+        response = await client.post('/api/payment/', {'amount': '9.99'}, headers=headers)
+        return response.status_code in (200, 202)
+
+    return await drive(operation, total, concurrency)
+
+
+async def _open_sockets(data, path, count):
+    application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+    sockets = []
+    for _ in range(count):
+        communicator = WebsocketCommunicator(application, f'{path}?token={data["token"]}')
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError(f'Could not connect to {path}')
+        sockets.append(communicator)
+    return sockets
+
+
+async def _close_sockets(sockets):
+    for communicator in sockets:
+        await communicator.disconnect()
+
+
+async def _drain(communicator):
+    while not await communicator.receive_nothing(timeout=0.01):
+        await communicator.receive_from()
+
+
+async def _request_reply(sockets, total, message, is_reply, drain=False, timeout=10):
+    """Each socket sends its share of ``total`` messages one at a time and
+    waits for the broadcast that answers it; latency is send-to-reply.
+
+    With ``drain`` set, broadcasts already waiting on the socket are
+    discarded before each send so they are not mistaken for the reply.
+    """
+    latencies = []
+    errors = 0
+
+    async def run(index, communicator):
+        nonlocal errors
+        for i in range(index, total, len(sockets)):
+            if drain:
+                await _drain(communicator)
+            started = time.perf_counter()
+            await communicator.send_to(json.dumps(message(i)))
+            try:
+                while not is_reply(json.loads(await communicator.receive_from(timeout=timeout)), i):
+                    pass
+                latencies.append(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(index, communicator) for index, communicator in enumerate(sockets)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+@scenario('ws_view_flood')
+async def ws_view_flood(data, total, concurrency, timeout=30):
+    """All sockets watch one video and fire ``total`` views without waiting.
+
+    Broadcasts are coalesced, so there is no per-view reply; a view's latency
+    runs from its send to the first broadcast whose count includes it, as
+    seen by the first socket. Views never seen within ``timeout`` are errors.
+    """
+    video_id = data['video_ids'][0]
+    start_count = await Video.objects.values_list('view_count', flat=True).aget(pk=video_id)
+    sockets = await _open_sockets(data, f'/ws/video/{video_id}/', concurrency)
+    sent = []
+    latencies = []
+
+    async def watch():
+        while len(latencies) < total:
+            event = json.loads(await sockets[0].receive_from(timeout=timeout))
+            seen = min(event.get('view_count', 0) - start_count, len(sent))
+            received = time.perf_counter()
+            while len(latencies) < seen:
+                latencies.append(received - sent[len(latencies)])
+
+    started = time.perf_counter()
+    watcher = asyncio.create_task(watch())
+    for i in range(total):
+        sent.append(time.perf_counter())
+        await sockets[i % len(sockets)].send_to(json.dumps({'action': 'view'}))
+    try:
+        await watcher
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    await _close_sockets(sockets)
+    await sync_to_async(flush_buffers)()
+    return summarize(latencies, elapsed, total - len(latencies))
+
+
+@scenario('ws_comment_flood')
+async def ws_comment_flood(data, total, concurrency):
+    video_id = data['video_ids'][1 % len(data['video_ids'])]
+    sockets = await _open_sockets(data, f'/ws/comments/{video_id}/', concurrency)
+    result = await _request_reply(
+        sockets, total,
+        message=lambda i: {'content': f'benchmark comment {i}'},
+        is_reply=lambda event, i: event.get('comment', {}).get('content') == f'benchmark comment {i}',
+    )
+    await _close_sockets(sockets)
+    return result
+
+
+@scenario('ws_rating_flood')
+async def ws_rating_flood(data, total, concurrency):
+    video_id = data['video_ids'][2 % len(data['video_ids'])]
+    sockets = await _open_sockets(data, f'/ws/rating/{video_id}/', concurrency)
+    # rating_update does not say whose vote it answers, so the reply is the
+    # first update received after sending.
+    result = await _request_reply(
+        sockets, total,
+        message=lambda i: {'score': 1 + i % 5},
+        is_reply=lambda event, i: 'average_rating' in event or 'error' in event,
+        drain=True,
+    )
+    await _close_sockets(sockets)
+    return result
+
+
+@scenario('db_contention')
+async def db_contention(data, total, concurrency):
+    """One write transaction for every three reads, each on its own connection."""
+    user, video_ids = data['user'], data['video_ids']
+
+    def operation(i):
+        video_id = video_ids[i % len(video_ids)]
+        if i % 4 == 0:
+            with transaction.atomic():
+                Comment.objects.create(user=user, video_id=video_id, content='contention')
+                Video.objects.filter(pk=video_id).update(view_count=F('view_count') + 1)
+        else:
+            list(Comment.objects.filter(video_id=video_id).order_by('-created_at', '-id')[:20])
+        return True
+
+    return await sync_to_async(drive_threads, thread_sensitive=False)(operation, total, concurrency)
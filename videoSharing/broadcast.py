@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .metrics import timed_group_send
+
+logger = logging.getLogger(__name__)
+
+
+class GroupBroadcastCoalescer:
+    """Send at most one event per group every ``interval`` seconds.
+
+    Publishing only records the latest event for the group; a ticker task
+    running on the ASGI event loop delivers whatever is pending on each tick
+    and exits once a tick finds nothing to send, so idle processes do not
+    keep waking up.
+    """
+
+    def __init__(self, interval, channel_layer_alias='default'):
+        self.interval = interval
+        self.channel_layer_alias = channel_layer_alias
+        self._pending = {}
+        self._task = None
+
+    async def publish(self, group, event):
+        self._pending[group] = event
+        self._ensure_ticking()
+
+    def _ensure_ticking(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._tick())
+
+    async def _tick(self):
+        channel_layer = get_channel_layer(self.channel_layer_alias)
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            results = await asyncio.gather(
+                *(timed_group_send(channel_layer, group, event) for group, event in pending.items()),
+                return_exceptions=True,
+            )
+            for group, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    logger.error('Broadcast to %s failed', group, exc_info=result)
+
+
+view_count_broadcaster = GroupBroadcastCoalescer(settings.VIEW_BROADCAST_INTERVAL)
+
+
+_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='channel-publish')
+
+
+def _log_publish_failure(future):
+    if future.exception() is not None:
+        logger.error('Background group_send failed', exc_info=future.exception())
+
+
+def publish_in_background(group, event):
+    """group_send ``event`` from sync code without waiting for the channel layer."""
+    future = _publisher.submit(async_to_sync(timed_group_send), get_channel_layer(), group, event)
+    future.add_done_callback(_log_publish_failure)
@@ -0,0 +1,43 @@
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .response_cache import (CATALOG_VERSION_KEY, COMMENTS_VERSION_KEY, VIDEO_VERSION_KEY, catalog_version,
+                             comments_version, query_digest, version_modified, video_version)
+
+# ETags and Last-Modified dates come from the response cache's version
+# counters, so a conditional GET is answered from the cache alone without
+# touching the database or serializing the body. A video's version only
+# moves when its content does (fields, view count, rating or comments);
+# watching it does not, so a client's own reads never change its ETag.
+
+
+def _query_string(request):
+    return request.META.get('QUERY_STRING', '')
+
+
+def video_list_etag(request, *args, **kwargs):
+    return f'catalog-{catalog_version()}-{query_digest(_query_string(request))}'
+
+
+def video_list_last_modified(request, *args, **kwargs):
+    return version_modified(CATALOG_VERSION_KEY)
+
+
+def video_detail_etag(request, pk=None, *args, **kwargs):
+    return f'video-{pk}-{video_version(pk)}'
+
+
+def video_detail_last_modified(request, pk=None, *args, **kwargs):
+    return version_modified(VIDEO_VERSION_KEY.format(pk))
+
+
+def comment_list_etag(request, *args, **kwargs):
+    return f'comments-{comments_version()}-{query_digest(_query_string(request))}'
+
+
+def comment_list_last_modified(request, *args, **kwargs):
+    return version_modified(COMMENTS_VERSION_KEY)
+
+
+def conditional(etag_func, last_modified_func):
+    return method_decorator(condition(etag_func=etag_func, last_modified_func=last_modified_func))
@@ -1,18 +1,195 @@
+import asyncio
 import json
+import logging
+import time
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.db.models import Avg
-from django.db import models
-from django.utils import timezone
+from django.conf import settings
 
-from .models import Video, User, Rating, Subscription, WatchHistory, Comment
+from .models import Video, Comment
+from .broadcast import view_count_broadcaster
+from .entitlements import entitlement_group, has_premium_access
+from .metrics import timed_group_send, track_queries, websocket_connections, websocket_messages_received, \
+    websocket_messages_rejected, websocket_messages_sent, websocket_receive_duration, websocket_receive_queries, \
+    websocket_receive_query_time
+from .rate_limit import TokenBucket, user_rate_limiter
+from .ratings import rate_video
+from .view_counter import record_view
+from .watch_events import record_watch
 
+logger = logging.getLogger(__name__)
 
-class VideoViewConsumer(AsyncWebsocketConsumer):
+
+class ConsumerMetricsMixin:
+    """Record open connections, messages in and out, handling latency and the
+    database queries each inbound message causes, labelled by consumer class.
+
+    Group sends made through ``group_send`` are timed as channel layer sends.
+    """
+
+    _metrics_connected = False
+
+    @property
+    def metrics_label(self):
+        return type(self).__name__
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        if not self._metrics_connected:
+            self._metrics_connected = True
+            websocket_connections.labels(self.metrics_label).inc()
+
+    async def websocket_disconnect(self, message):
+        try:
+            await super().websocket_disconnect(message)
+        finally:
+            if self._metrics_connected:
+                self._metrics_connected = False
+                websocket_connections.labels(self.metrics_label).dec()
+
+    async def websocket_receive(self, message):
+        label = self.metrics_label
+        websocket_messages_received.labels(label).inc()
+        started = time.perf_counter()
+        with track_queries() as stats:
+            try:
+                await super().websocket_receive(message)
+            finally:
+                websocket_receive_duration.labels(label).observe(time.perf_counter() - started)
+                websocket_receive_queries.labels(label).observe(stats.count)
+                websocket_receive_query_time.labels(label).inc(stats.seconds)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is not None or bytes_data is not None:
+            websocket_messages_sent.labels(self.metrics_label).inc()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def group_send(self, group, event):
+        await timed_group_send(self.channel_layer, group, event)
+
+
+class InboundRateLimitMixin:
+    """Rate limit inbound messages and handle them from a bounded per-connection queue.
+
+    A message needs a token from the connection's bucket and from the user's
+    bucket, which all of the user's connections to the same consumer class
+    share (across workers with the 'redis' backend), and room in the queue.
+    Otherwise it is rejected according to ``ON_LIMIT``: 'drop' discards it,
+    telling the client once until a message gets through again, and closes
+    the socket after ``CLOSE_AFTER_DROPS`` drops in a row; 'close' closes it
+    straight away. Either way the socket closes with code 4029.
+
+    Messages are handled one at a time by a task of their own, so the
+    consumer keeps reading from the server and a flood piles up in the
+    bounded queue instead of the server's unbounded one.
+    """
+
+    RATE_LIMITED_CLOSE_CODE = 4029
+
+    _inbound = None
+    _inbound_worker = None
+    _connection_bucket = None
+    _dropped = 0
+    _rate_limit_closed = False
+
+    async def websocket_receive(self, message):
+        if self._rate_limit_closed:
+            return
+        config = settings.WEBSOCKET_RATE_LIMIT
+        if self._inbound is None:
+            self._inbound = asyncio.Queue(config['MAX_QUEUE'])
+            if config['CONNECTION']:
+                self._connection_bucket = TokenBucket(*config['CONNECTION'])
+            self._inbound_worker = asyncio.create_task(self._handle_inbound())
+
+        reason = await self.rate_limit_reason(config)
+        if reason is None:
+            try:
+                self._inbound.put_nowait(message)
+            except asyncio.QueueFull:
+                reason = 'queue_full'
+        if reason is None:
+            self._dropped = 0
+        else:
+            await self.reject_message(reason, config)
+
+    async def rate_limit_reason(self, config):
+        if self._connection_bucket is not None and not self._connection_bucket.take():
+            return 'connection_rate'
+        user = self.scope.get('user')
+        if config['USER'] and user is not None and user.is_authenticated:
+            if not await user_rate_limiter.aallow(f'ws:{type(self).__name__}:{user.pk}', *config['USER']):
+                return 'user_rate'
+        return None
+
+    async def reject_message(self, reason, config):
+        websocket_messages_rejected.labels(type(self).__name__, reason).inc()
+        self._dropped += 1
+        if config['ON_LIMIT'] == 'close' or 0 < config['CLOSE_AFTER_DROPS'] <= self._dropped:
+            self._rate_limit_closed = True
+            await self.close(code=self.RATE_LIMITED_CLOSE_CODE)
+        elif self._dropped == 1:
+            await self.send(text_data=json.dumps({'error': 'Too many messages, slow down.', 'reason': reason}))
+
+    async def _handle_inbound(self):
+        while True:
+            message = await self._inbound.get()
+            try:
+                await super().websocket_receive(message)
+            except Exception:
+                logger.exception('%s failed to handle a message; closing the connection', type(self).__name__)
+                self._rate_limit_closed = True
+                await self.close(code=1011)
+                return
+
+    async def websocket_disconnect(self, message):
+        if self._inbound_worker is not None:
+            self._inbound_worker.cancel()
+        await super().websocket_disconnect(message)
+
+
+class EntitlementCacheMixin:
+    """Cache the connected user's premium entitlement until the server invalidates it.
+
+    The entitlement is resolved on connect and the connection joins the
+    user's entitlement group; an ``entitlement_changed`` event pushed when
+    the subscription changes makes the next check resolve it again.
+    """
+
+    premium_access = None
+
+    async def load_entitlement(self):
+        await self.channel_layer.group_add(entitlement_group(self.user.pk), self.channel_name)
+        await self.has_premium_access()
+
+    async def has_premium_access(self):
+        if self.premium_access is None:
+            self.premium_access = await database_sync_to_async(has_premium_access)(self.user.pk)
+        return self.premium_access
+
+    async def entitlement_changed(self, event):
+        self.premium_access = None
+
+    async def discard_entitlement_group(self):
+        await self.channel_layer.group_discard(entitlement_group(self.user.pk), self.channel_name)
+
+
+class VideoViewConsumer(InboundRateLimitMixin, ConsumerMetricsMixin, EntitlementCacheMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.video_id = self.scope['url_route']['kwargs']['video_id']
         self.room_group_name = f'video_{self.video_id}'
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.video_is_premium = await self.get_video_is_premium(self.video_id)
+        if self.video_is_premium is None:
+            logger.info('Rejected a view socket for missing video %s', self.video_id)
+            await self.close()
+            return
+        await self.load_entitlement()
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -25,29 +202,25 @@ class VideoViewConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        if self.user.is_authenticated:
+            await self.discard_entitlement_group()
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         action = data.get('action', '')
-        user_id = data.get('user_id')
-
-        if not user_id or not str(user_id).isdigit():
-            await self.send(text_data=json.dumps({"error": "Invalid user_id"}))
-            return
 
-        user_id = int(user_id)
-        check_allowance = await self.check_allowance(self.video_id, user_id)
+        check_allowance = await self.check_allowance()
         if action == 'view':
             if not check_allowance:
                 await self.send(text_data=json.dumps({'error': 'You must have a premium subscription to watch this video.'}))
             else:
-                video = await self.increment_view_count(self.video_id)
-                await self.record_watch_history(video.id, user_id)
-                await self.channel_layer.group_send(
+                view_count = await self.increment_view_count(self.video_id)
+                await self.record_watch_history(self.video_id, self.user.pk)
+                await view_count_broadcaster.publish(
                     self.room_group_name,
                     {
                         'type': 'video_view_update',
-                        'view_count': video.view_count
+                        'view_count': view_count
                     }
                 )
 
@@ -59,36 +232,30 @@ class VideoViewConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def record_watch_history(self, video_id, user_id):
-        user = User.objects.get(pk=user_id)
-        video = Video.objects.get(id=video_id)
-        watch_history = WatchHistory(video=video, user=user, watch_date=timezone.now())
-        watch_history.save()
+        record_watch(user_id, video_id)
 
     @database_sync_to_async
     def increment_view_count(self, video_id):
-        video = Video.objects.get(id=video_id)
-        video.view_count += 1
-        video.save()
-        return video
+        return record_view(video_id)
+
+    async def check_allowance(self):
+        if not self.video_is_premium:
+            return True
+        return await self.has_premium_access()
 
     @database_sync_to_async
-    def check_allowance(self, video_id, user_id):
-        try:
-            video = Video.objects.get(id=video_id)
-            user = User.objects.get(pk=user_id)
-            return video.allowed_to_watch(user)
-        except Video.DoesNotExist:
-            print(f"Video with id {video_id} does not exist")
-            return False
-        except User.DoesNotExist:
-            print(f"User with id {user_id} does not exist")
-            return False
-
-
-class CommentConsumer(AsyncWebsocketConsumer):
+    def get_video_is_premium(self, video_id):
+        return Video.objects.filter(id=video_id).values_list('is_premium', flat=True).first()
+
+
+class CommentConsumer(InboundRateLimitMixin, ConsumerMetricsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.video_id = self.scope['url_route']['kwargs']['video_id']
         self.room_group_name = f'comments_{self.video_id}'
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -104,28 +271,21 @@ class CommentConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         data = json.loads(text_data)
-        user_id = data.get('user_id')
         content = data.get('content')
 
-        if not user_id or not str(user_id).isdigit():
-            await self.send(text_data=json.dumps({"error": "Invalid user_id"}))
-            return
-
-        user_id = int(user_id)
-
         if not content or len(content.strip()) == 0:
             await self.send(text_data=json.dumps({"error": "Comment cannot be empty"}))
             return
 
-        comment = await self.save_comment(user_id, self.video_id, content)
+        comment = await self.save_comment(self.video_id, content)
 
-        await self.channel_layer.group_send(
+        await self.group_send(
             self.room_group_name,
             {
                 'type': 'comment_message',
                 'comment': {
-                    'user': comment.user.username,
-                    'video': comment.video.id,
+                    'user': self.user.username,
+                    'video': comment.video_id,
                     'content': comment.content,
                     'created_at': comment.created_at.isoformat()
                 }
@@ -139,17 +299,20 @@ class CommentConsumer(AsyncWebsocketConsumer):
         }))
 
     @database_sync_to_async
-    def save_comment(self, user_id, video_id, content):
-        user = User.objects.get(pk=user_id)
-        video = Video.objects.get(pk=video_id)
-        comment = Comment.objects.create(user=user, video=video, content=content)
-        return comment
+    def save_comment(self, video_id, content):
+        return Comment.objects.create(user=self.user, video_id=int(video_id), content=content)
 
 
-class RatingConsumer(AsyncWebsocketConsumer):
+class RatingConsumer(InboundRateLimitMixin, ConsumerMetricsMixin, EntitlementCacheMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.video_id = self.scope['url_route']['kwargs']['video_id']
         self.room_group_name = f'ratings_{self.video_id}'
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        await self.load_entitlement()
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -162,20 +325,17 @@ class RatingConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        if self.user.is_authenticated:
+            await self.discard_entitlement_group()
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         score = data['score']
-        user_id = data['user_id']
-
-        if await self.is_premium_user(user_id):
-            await self.save_rating(self.video_id, user_id, score)
-
-            video = await self.get_video(self.video_id)
 
-            average_rating = await self.update_average_rating(video)
+        if await self.has_premium_access():
+            average_rating = await self.save_rating(self.video_id, self.user.pk, score)
 
-            await self.channel_layer.group_send(
+            await self.group_send(
                 self.room_group_name,
                 {
                     'type': 'rating_update',
@@ -195,33 +355,4 @@ class RatingConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def save_rating(self, video_id, user_id, score):
-        video = Video.objects.get(id=video_id)
-        user = User.objects.get(id=user_id)
-        rating, created = Rating.objects.update_or_create(
-            user=user, video=video,
-            defaults={'score': score}
-        )
-
-    @database_sync_to_async
-    def update_average_rating(self, video):
-        ratings = Rating.objects.filter(video=video)
-        average_rating = ratings.aggregate(models.Avg('score'))['score__avg'] or 0.0
-        video.average_rating = average_rating
-        video.save()
-        print(f'New average rating calculated: {average_rating}')
-        return average_rating
-
-    @database_sync_to_async
-    def get_video(self, video_id):
-        return Video.objects.get(id=video_id)
-
-    @database_sync_to_async
-    def is_premium_user(self, user_id):
-        try:
-            user = User.objects.get(id=user_id)
-            subscription = Subscription.objects.get(user=user)
-            return subscription.subscription_type == 'premium'
-        except User.DoesNotExist:
-            return False
-        except Subscription.DoesNotExist:
-            return False
+        return rate_video(user_id, video_id, score)
@@ -0,0 +1,88 @@
+import logging
+import time
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .broadcast import publish_in_background
+from .models import Subscription
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'entitlement:premium:{}'
+
+
+def entitlement_group(user_id):
+    return f'entitlements_{user_id}'
+
+
+def has_premium_access(user_id):
+    """Return whether ``user_id`` currently holds an active premium subscription.
+
+    The answer is cached for ``ENTITLEMENT_CACHE_TIMEOUT`` seconds and dropped
+    by ``invalidate_entitlement`` whenever the user's subscription changes.
+    """
+    key = CACHE_KEY.format(user_id)
+    premium = cache.get(key)
+    if premium is None:
+        premium = Subscription.objects.filter(
+            user_id=user_id, is_active=True, subscription_type='premium'
+        ).exists()
+        cache.set(key, premium, settings.ENTITLEMENT_CACHE_TIMEOUT)
+    return premium
+
+
+def invalidate_entitlements(user_ids):
+    """Drop cached entitlements and tell every open websocket of these users.
+
+    Runs after the subscription change has committed, so a cache or channel
+    layer outage is logged rather than failing the request that made it;
+    the cached answer then lives out its ``ENTITLEMENT_CACHE_TIMEOUT``. The
+    websocket notifications are sent in the background.
+    """
+    user_ids = list(user_ids)
+    try:
+        cache.delete_many([CACHE_KEY.format(user_id) for user_id in user_ids])
+    except Exception:
+        logger.exception('Could not drop cached entitlements of %d users', len(user_ids))
+
+    for user_id in user_ids:
+        publish_in_background(entitlement_group(user_id), {'type': 'entitlement_changed', 'user_id': user_id})
+
+
+def invalidate_entitlement(user_id):
+    invalidate_entitlements([user_id])
+
+
+def expire_subscriptions(now=None, batch_size=1000, pause=0, progress=None):
+    """Deactivate active subscriptions that ended before ``now``, ``batch_size`` at a time.
+
+    Each batch locks its rows, skipping any being renewed, and deactivates
+    them with one UPDATE by primary key in its own transaction. Users who
+    lose premium access get their entitlements invalidated once it commits;
+    free subscriptions grant nothing to take away. Returns the number of
+    subscriptions expired per subscription type.
+    """
+    now = timezone.now() if now is None else now
+    expired = Counter()
+    while True:
+        with transaction.atomic():
+            rows = list(Subscription.objects.select_for_update(skip_locked=True)
+                        .filter(is_active=True, end_date__lt=now)
+                        .order_by('end_date')
+                        .values_list('pk', 'user_id', 'subscription_type')[:batch_size])
+            if not rows:
+                return expired
+            Subscription.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(is_active=False)
+            premium_users = [user_id for _, user_id, kind in rows if kind == 'premium']
+            if premium_users:
+                transaction.on_commit(partial(invalidate_entitlements, premium_users), robust=True)
+        expired.update(kind for _, _, kind in rows)
+        if progress is not None:
+            progress(expired)
+        if pause:
+            time.sleep(pause)
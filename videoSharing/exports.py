@@ -0,0 +1,104 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ingest import chunked
+from .models import Payment, WatchHistory
+
+# Bulk exports for compliance and analytics. Rows are read as values_list
+# tuples through a chunked cursor (a server-side cursor on PostgreSQL), so no
+# model instances are built and memory stays flat however many rows match.
+
+DATASETS = {
+    'watch_history': (WatchHistory, 'watch_date', ('id', 'user_id', 'video_id', 'watch_date')),
+    'payments': (Payment, 'created_at', ('id', 'user_id', 'amount', 'transaction_id', 'status', 'created_at')),
+}
+
+
+def parse_moment(value):
+    """Parse an ISO 8601 date or datetime; naive values are taken as UTC."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def export_queryset(dataset, start=None, end=None, user_id=None):
+    """Return the rows of ``dataset`` dated in ``[start, end)``, oldest first."""
+    model, date_field, columns = DATASETS[dataset]
+    queryset = model.objects.order_by(date_field, 'id')
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset.values_list(*columns)
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, decimal.Decimal)):
+        return _value(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+# Called by the C encoder only for the values it cannot serialize itself.
+_encode_json = json.JSONEncoder(default=_json_default).encode
+
+
+def encode_ndjson(columns, rows):
+    return ''.join(_encode_json(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def encode_csv(columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+# format: (content type, encoder, whether the output starts with a header row)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', encode_ndjson, False),
+    'csv': ('text/csv; charset=utf-8', encode_csv, True),
+}
+
+
+def export_header(dataset, file_format):
+    columns = DATASETS[dataset][2]
+    _, encode, header = FORMATS[file_format]
+    return encode(columns, [columns]) if header else ''
+
+
+async def stream_export(dataset, queryset, file_format, chunk_size):
+    """Yield the encoded export a chunk of ``chunk_size`` rows at a time.
+
+    Asynchronous so ASGI sends each chunk as it is produced; Django reads a
+    synchronous iterator to the end before sending anything. Chunks are
+    fetched in the sync thread, as ``values_list().aiterator()`` would run
+    its query on the event loop.
+    """
+    columns = DATASETS[dataset][2]
+    encode = FORMATS[file_format][1]
+    chunks = chunked(queryset.iterator(chunk_size=chunk_size), chunk_size)
+    next_chunk = sync_to_async(next)
+    yield export_header(dataset, file_format)
+    while (rows := await next_chunk(chunks, None)) is not None:
+        yield encode(columns, rows)
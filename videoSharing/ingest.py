@@ -0,0 +1,126 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from .models import Video
+from .response_cache import invalidate_videos
+
+# Catalog ingestion for partner feeds. Rows are validated with plain
+# functions rather than a serializer per row, and written a chunk at a time:
+# one query finds which URLs already exist, then new videos are inserted with
+# bulk_create and changed ones rewritten with bulk_update.
+
+FIELDS = ('title', 'description', 'url', 'is_premium')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+_validate_url = URLValidator()
+_title_max_length = Video._meta.get_field('title').max_length
+_url_max_length = Video._meta.get_field('url').max_length
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def read_csv(stream):
+    for line_number, row in enumerate(csv.DictReader(stream), start=2):
+        yield line_number, row
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, InvalidRow(f'invalid JSON: {e}')
+            continue
+        yield line_number, row
+
+
+def parse_bool(value, default=True):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise InvalidRow(f'is_premium: {value!r} is not a boolean')
+
+
+def text_value(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise InvalidRow(f'{field}: expected a string, got {type(value).__name__}')
+    return value
+
+
+def clean_row(row):
+    """Return the Video field values of ``row`` or raise InvalidRow."""
+    if isinstance(row, InvalidRow):
+        raise row
+    if not isinstance(row, dict):
+        raise InvalidRow('expected an object')
+
+    title = text_value(row, 'title').strip()
+    url = text_value(row, 'url').strip()
+    if not title:
+        raise InvalidRow('title: this field is required')
+    if len(title) > _title_max_length:
+        raise InvalidRow(f'title: longer than {_title_max_length} characters')
+    if len(url) > _url_max_length:
+        raise InvalidRow(f'url: longer than {_url_max_length} characters')
+    try:
+        _validate_url(url)
+    except ValidationError:
+        raise InvalidRow(f'url: {url!r} is not a valid URL')
+    return {
+        'title': title,
+        'description': text_value(row, 'description'),
+        'url': url,
+        'is_premium': parse_bool(row.get('is_premium')),
+    }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def upsert_videos(rows):
+    """Create or update videos by URL in one transaction; return ``(created, updated)``.
+
+    ``rows`` are cleaned field dicts; when a URL repeats, the last row wins.
+    Videos already matching their row are left untouched.
+    """
+    by_url = {row['url']: row for row in rows}
+    with transaction.atomic():
+        existing = {}
+        for video in Video.objects.filter(url__in=by_url).only('id', *FIELDS):
+            existing.setdefault(video.url, video)
+
+        changed = []
+        for url, video in existing.items():
+            row = by_url.pop(url)
+            if any(getattr(video, field) != value for field, value in row.items()):
+                for field, value in row.items():
+                    setattr(video, field, value)
+                changed.append(video)
+        Video.objects.bulk_update(changed, ['title', 'description', 'is_premium'])
+        created = Video.objects.bulk_create([Video(**row) for row in by_url.values()])
+
+        video_ids = [video.pk for video in changed] + [video.pk for video in created]
+        transaction.on_commit(lambda: invalidate_videos(video_ids), robust=True)
+    return len(created), len(changed)
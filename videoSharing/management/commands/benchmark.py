@@ -0,0 +1,96 @@
+import json
+import os
+import platform
+import tempfile
+
+import django
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from videoSharing.benchmarks import SCENARIOS, QueryCounter, seed
+
+BENCHMARK_SETTINGS = {
+    # Keep the run independent of a Redis server.
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    # The flood scenarios measure capacity, not the per-client limits.
+    'WEBSOCKET_RATE_LIMIT': {'BACKEND': 'memory', 'CONNECTION': None, 'USER': None, 'MAX_QUEUE': 0,
+                             'ON_LIMIT': 'drop', 'CLOSE_AFTER_DROPS': 0},
+}
+
+CACHE_BACKENDS = {
+    # 'none' measures the views themselves rather than the response cache.
+    'none': 'django.core.cache.backends.dummy.DummyCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+class Command(BaseCommand):
+    help = ('Run benchmark scenarios in-process against a throwaway test database and report '
+            'throughput, latency percentiles and database queries per scenario as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'Scenarios to run (default: all). '
+                                                         f'Available: {", ".join(SCENARIOS)}.')
+        parser.add_argument('--requests', type=int, default=500, help='Operations per scenario.')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Operations in flight at once (websocket connections for ws_* scenarios).')
+        parser.add_argument('--videos', type=int, default=200, help='Videos seeded before the run.')
+        parser.add_argument('--cache', choices=CACHE_BACKENDS, default='none',
+                            help='Cache backend used during the run.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # An in-memory database has no WAL and no file locking, so it
+            # would hide exactly the contention the SQLite profile tunes.
+            fd, path = tempfile.mkstemp(prefix='benchmark-', suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict['TEST']['NAME'] = path
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'parameters': {key: options[key] for key in ('requests', 'concurrency', 'videos', 'cache')},
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_options': {
+                    key: value for key, value in connection.settings_dict['OPTIONS'].items() if key != 'pool'
+                },
+                'database_pool': bool(connection.settings_dict['OPTIONS'].get('pool')),
+            },
+            'scenarios': {},
+        }
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            caches = {'default': {'BACKEND': CACHE_BACKENDS[options['cache']]}}
+            with override_settings(CACHES=caches, **BENCHMARK_SETTINGS):
+                data = seed(videos=options['videos'])
+                for name in names:
+                    counter = QueryCounter()
+                    with counter.installed():
+                        result = async_to_sync(SCENARIOS[name])(data, options['requests'], options['concurrency'])
+                    result.update(counter.as_dict(result['operations']))
+                    report['scenarios'][name] = result
+                    self.stderr.write(f'{name}: {result["throughput_ops"]} ops/s, p99 {result["p99_ms"]} ms, '
+                                      f'{result["db_queries_per_op"]} queries/op, {result["errors"]} errors')
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
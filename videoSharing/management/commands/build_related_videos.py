@@ -0,0 +1,85 @@
+from array import array
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from videoSharing.models import Video, WatchHistory
+from videoSharing.related import replace_neighbors
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the "viewers also watched" neighbor table from WatchHistory by item-item '
+            'co-occurrence over a sparse user x video matrix.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RELATED_VIDEOS['TOP_K'],
+                            help='Neighbors kept per video.')
+        parser.add_argument('--min-shared', type=int, default=settings.RELATED_VIDEOS['MIN_SHARED'],
+                            help='Minimum number of shared viewers for a neighbor to be kept.')
+        parser.add_argument('--block-size', type=int, default=2000,
+                            help='Videos whose co-occurrences are computed and written at once.')
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='WatchHistory rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from scipy import sparse
+        except ImportError:
+            raise CommandError('build_related_videos needs numpy and scipy installed.')
+
+        top_k, min_shared, block_size = options['top_k'], options['min_shared'], options['block_size']
+
+        users, videos = array('q'), array('q')
+        rows = WatchHistory.objects.order_by().values_list('user_id', 'video_id').iterator(
+            chunk_size=options['chunk_size'])
+        for user_id, video_id in rows:
+            users.append(user_id)
+            videos.append(video_id)
+        users = np.frombuffer(users, dtype=np.int64)
+        videos = np.frombuffer(videos, dtype=np.int64)
+        self.stdout.write(f'Loaded {len(users)} watch history rows.')
+
+        # Drop rows of videos deleted while the history was being read.
+        existing = np.fromiter(Video.objects.values_list('pk', flat=True).iterator(), dtype=np.int64)
+        keep = np.isin(videos, existing)
+        users, videos = users[keep], videos[keep]
+
+        user_ids, user_index = np.unique(users, return_inverse=True)
+        video_ids, video_index = np.unique(videos, return_inverse=True)
+        # One row per user and a 1 for every video they watched; WatchHistory
+        # holds one row per (user, video), so there are no duplicates to sum.
+        watched = sparse.csr_matrix(
+            (np.ones(len(users), dtype=np.int32), (user_index, video_index)),
+            shape=(len(user_ids), len(video_ids)),
+        )
+        watched_by = watched.T.tocsr()
+
+        written = 0
+        low = 0
+        for start in range(0, len(video_ids), block_size):
+            stop = min(start + block_size, len(video_ids))
+            # shared[i, j] is the number of users who watched both videos.
+            shared = (watched_by[start:stop] @ watched).tocsr()
+            rows = []
+            for offset in range(stop - start):
+                row = start + offset
+                begin, end = shared.indptr[offset], shared.indptr[offset + 1]
+                neighbors, counts = shared.indices[begin:end], shared.data[begin:end]
+                mask = (neighbors != row) & (counts >= min_shared)
+                neighbors, counts = neighbors[mask], counts[mask]
+                if len(counts) > top_k:
+                    best = np.argpartition(-counts, top_k - 1)[:top_k]
+                    neighbors, counts = neighbors[best], counts[best]
+                rows.extend(zip([int(video_ids[row])] * len(neighbors),
+                                video_ids[neighbors].tolist(), counts.tolist()))
+
+            high = None if stop == len(video_ids) else int(video_ids[stop - 1])
+            replace_neighbors(low, high, rows)
+            low = high
+            written += len(rows)
+            self.stdout.write(f'Processed {stop} of {len(video_ids)} videos, {written} neighbors written.')
+
+        if not len(video_ids):
+            replace_neighbors(0, None, [])
+        self.stdout.write(self.style.SUCCESS(f'Done: {written} neighbors for {len(video_ids)} videos.'))
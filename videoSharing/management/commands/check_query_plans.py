@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from videoSharing.models import Comment, Payment, Rating, Subscription, Video, WatchHistory
+
+# (description, queryset factory, names under which the plan may report the index).
+# SQLite creates unique constraints as table constraints backed by an autoindex.
+HOT_QUERIES = [
+    ('video catalog page',
+     lambda: Video.objects.order_by('-upload_date', '-id')[:20],
+     ('video_upload_date_idx',)),
+    ('comments of a video, newest first',
+     lambda: Comment.objects.filter(video_id=1).order_by('-created_at', '-id')[:20],
+     ('comment_video_created_idx',)),
+    ('comment feed, newest first',
+     lambda: Comment.objects.order_by('-created_at', '-id')[:20],
+     ('comment_created_idx',)),
+    ('watch history of a video, newest first',
+     lambda: WatchHistory.objects.filter(video_id=1).order_by('-watch_date', '-id')[:20],
+     ('watch_history_video_date_idx',)),
+    ('watch history of a user, newest first',
+     lambda: WatchHistory.objects.filter(user_id=1).order_by('-watch_date', '-id')[:20],
+     ('watch_history_user_date_idx',)),
+    ('watch history upsert lookup',
+     lambda: WatchHistory.objects.filter(user_id=1, video_id=1),
+     ('unique_watch_history_user_video', 'sqlite_autoindex_videoSharing_watchhistory')),
+    ('rating upsert lookup',
+     lambda: Rating.objects.filter(user_id=1, video_id=1),
+     ('unique_rating_user_video', 'sqlite_autoindex_videoSharing_rating')),
+    ('payment history of a user, newest first',
+     lambda: Payment.objects.filter(user_id=1).order_by('-created_at', '-id')[:20],
+     ('payment_user_created_idx',)),
+    ('subscriptions left to expire',
+     lambda: Subscription.objects.filter(is_active=True, end_date__lt=timezone.now()).order_by('end_date')[:1000],
+     ('subscription_active_end_idx',)),
+]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot queries and fail if any of them does not use its index.'
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            # Small tables are cheaper to scan, which would hide a missing index.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+        failures = []
+        for description, queryset, index_names in HOT_QUERIES:
+            plan = queryset().explain()
+            if any(name.lower() in plan.lower() for name in index_names):
+                self.stdout.write(f'ok    {description}: {index_names[0]}')
+            else:
+                failures.append(description)
+                self.stdout.write(self.style.ERROR(f'FAIL  {description}: expected {index_names[0]}'))
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries do not use their index.')
+        self.stdout.write(self.style.SUCCESS('All hot queries use their index.'))
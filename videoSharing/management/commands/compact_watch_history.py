@@ -0,0 +1,57 @@
+import datetime
+import gzip
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from videoSharing.analytics import prune_view_series
+from videoSharing.rollups import delete_expired_watch_history
+
+
+class Command(BaseCommand):
+    help = ('Delete WatchHistory rows older than the retention period in small batches. Watch events '
+            'are already rolled up into VideoDailyStats and UserDailyStats as they are written. '
+            'Also drops hourly view analytics buckets past their retention.')
+
+    def add_arguments(self, parser):
+        config = settings.WATCH_HISTORY_RETENTION
+        parser.add_argument('--retention-days', type=int, default=config['DAYS'],
+                            help='Keep rows watched within this many days.')
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=config['PAUSE'],
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--archive', help='Append deleted rows as NDJSON to this file (gzipped if it ends in .gz).')
+        parser.add_argument('--loop', action='store_true', help='Keep running, compacting every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=config['INTERVAL'],
+                            help='Seconds between runs with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.compact(options)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def compact(self, options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['retention_days'])
+        archive = None
+        if options['archive']:
+            opener = gzip.open if options['archive'].endswith('.gz') else open
+            archive = opener(options['archive'], 'at')
+        try:
+            deleted = delete_expired_watch_history(
+                cutoff, options['batch_size'], options['pause'], archive,
+                progress=lambda count: self.stdout.write(f'Deleted {count} rows...'),
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} watch history rows older than {cutoff:%Y-%m-%d %H:%M}.'))
+
+        hourly_cutoff = timezone.now() - datetime.timedelta(days=settings.VIEW_ANALYTICS['HOURLY_RETENTION_DAYS'])
+        pruned = prune_view_series('hour', hourly_cutoff, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {pruned} hourly view buckets older than '
+                                             f'{hourly_cutoff:%Y-%m-%d %H:%M}.'))
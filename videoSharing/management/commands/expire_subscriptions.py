@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from videoSharing.entitlements import expire_subscriptions
+
+
+def describe(expired):
+    counts = ', '.join(f'{count} {kind}' for kind, count in sorted(expired.items()))
+    return f'{expired.total()} subscriptions' + (f' ({counts})' if counts else '')
+
+
+class Command(BaseCommand):
+    help = ('Deactivate subscriptions whose end date has passed, in batches, and invalidate the '
+            'entitlements of users who lose premium access.')
+
+    def add_arguments(self, parser):
+        config = settings.SUBSCRIPTION_EXPIRY
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='Subscriptions expired per transaction.')
+        parser.add_argument('--pause', type=float, default=config['PAUSE'],
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--loop', action='store_true', help='Keep running, sweeping every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=config['INTERVAL'],
+                            help='Seconds between sweeps with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_subscriptions(
+                batch_size=options['batch_size'], pause=options['pause'],
+                progress=lambda expired: self.stdout.write(f'Expired {describe(expired)}...'),
+            )
+            self.stdout.write(self.style.SUCCESS(f'Expired {describe(expired)}.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,52 @@
+import gzip
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from videoSharing.exports import DATASETS, FORMATS, export_header, export_queryset, parse_moment
+from videoSharing.ingest import chunked
+
+
+class Command(BaseCommand):
+    help = 'Export watch history or payments as NDJSON or CSV, streaming rows in flat memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--start', help='Only rows dated at or after this ISO 8601 date or datetime.')
+        parser.add_argument('--end', help='Only rows dated before this ISO 8601 date or datetime.')
+        parser.add_argument('--user', type=int, help='Only rows of this user id.')
+        parser.add_argument('--output', default='-',
+                            help="File to write (gzipped if it ends in .gz), or '-' for standard output.")
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORTS['CHUNK_SIZE'],
+                            help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        dataset, file_format, chunk_size = options['dataset'], options['format'], options['chunk_size']
+        try:
+            start, end = parse_moment(options['start']), parse_moment(options['end'])
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        path = options['output']
+        if path == '-':
+            output = sys.stdout
+        else:
+            opener = gzip.open if path.endswith('.gz') else open
+            output = opener(path, 'wt', newline='', encoding='utf-8')
+
+        columns = DATASETS[dataset][2]
+        encode = FORMATS[file_format][1]
+        exported = 0
+        try:
+            output.write(export_header(dataset, file_format))
+            rows = export_queryset(dataset, start, end, options['user']).iterator(chunk_size=chunk_size)
+            for chunk in chunked(rows, chunk_size):
+                output.write(encode(columns, chunk))
+                exported += len(chunk)
+                self.stderr.write(f'Exported {exported} rows...')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f'Done: {exported} {dataset} rows.'))
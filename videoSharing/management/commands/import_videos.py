@@ -0,0 +1,66 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from videoSharing.ingest import InvalidRow, chunked, clean_row, read_csv, read_jsonl, upsert_videos
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = ('Import videos from a CSV or JSON Lines file (title, description, url, is_premium), '
+            'creating new videos and updating existing ones matched by URL, a chunk per transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=READERS,
+                            help='Input format (default: from the file extension).')
+        parser.add_argument('--chunk-size', type=int, default=settings.VIDEO_IMPORT['CHUNK_SIZE'],
+                            help='Rows written per transaction.')
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Abort after this many invalid rows (0 for no limit).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading standard input.')
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            self.import_rows(READERS[fmt](stream), options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def import_rows(self, rows, options):
+        processed = created = updated = errors = 0
+        started = time.monotonic()
+
+        for chunk in chunked(rows, options['chunk_size']):
+            valid = []
+            for line_number, row in chunk:
+                try:
+                    valid.append(clean_row(row))
+                except InvalidRow as e:
+                    errors += 1
+                    self.stderr.write(f'Line {line_number}: {e}')
+                    if options['max_errors'] and errors >= options['max_errors']:
+                        raise CommandError(f'Aborting after {errors} invalid rows; '
+                                           f'{created} videos created and {updated} updated so far.')
+
+            chunk_created, chunk_updated = upsert_videos(valid)
+            processed += len(chunk)
+            created += chunk_created
+            updated += chunk_updated
+            rate = processed / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f'{processed} rows: {created} created, {updated} updated, '
+                              f'{errors} invalid ({rate:.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {processed} rows, {created} created, {updated} updated, {errors} invalid.'))
@@ -0,0 +1,39 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from videoSharing.payment_processor import get_payment_processor
+from videoSharing.payments import charge_payment, claim_payments, relay_outbox
+
+
+class Command(BaseCommand):
+    help = ('Charge queued payments through the payment gateway and apply the resulting '
+            'subscription changes from the outbox.')
+
+    def add_arguments(self, parser):
+        config = settings.PAYMENTS
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='Payments leased, and outbox events relayed, per round.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, polling every --interval seconds when idle.')
+        parser.add_argument('--interval', type=float, default=config['POLL_INTERVAL'],
+                            help='Seconds to wait for new work with --loop.')
+
+    def handle(self, *args, **options):
+        processor = get_payment_processor()
+        while True:
+            busy = self.process(processor, options['batch_size'])
+            if not options['loop']:
+                return
+            if not busy:
+                time.sleep(options['interval'])
+
+    def process(self, processor, batch_size):
+        outcomes = Counter(charge_payment(payment, processor) for payment in claim_payments(batch_size))
+        applied = relay_outbox(batch_size)
+        if outcomes or applied:
+            charged = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
+            self.stdout.write(f'Payments: {charged or "none"}; outbox events applied: {applied}.')
+        return bool(outcomes or applied)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from videoSharing.models import Rating, Video
+from videoSharing.ratings import average_of
+
+
+class Command(BaseCommand):
+    help = 'Recompute the running rating totals of every video from its Rating rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of videos recomputed per transaction.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        checked = repaired = 0
+
+        while True:
+            with transaction.atomic():
+                videos = list(
+                    Video.objects.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .order_by('pk')
+                    .only('rating_sum', 'rating_count', 'average_rating')[:chunk_size]
+                )
+                if not videos:
+                    break
+                last_id = videos[-1].pk
+
+                totals = {
+                    row['video']: (row['total'], row['count'])
+                    for row in Rating.objects.filter(video__in=videos)
+                    .values('video')
+                    .annotate(total=Sum('score'), count=Count('id'))
+                }
+
+                drifted = []
+                for video in videos:
+                    rating_sum, rating_count = totals.get(video.pk, (0, 0))
+                    average_rating = average_of(rating_sum, rating_count)
+                    if (video.rating_sum, video.rating_count, video.average_rating) != (rating_sum, rating_count, average_rating):
+                        video.rating_sum = rating_sum
+                        video.rating_count = rating_count
+                        video.average_rating = average_rating
+                        drifted.append(video)
+
+                Video.objects.bulk_update(drifted, ['rating_sum', 'rating_count', 'average_rating'])
+
+            checked += len(videos)
+            repaired += len(drifted)
+            self.stdout.write(f'Checked {checked} videos, repaired {repaired}.')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {repaired} of {checked} videos had drifted.'))
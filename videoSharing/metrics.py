@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db.backends.signals import connection_created
+
+# A small in-process metrics registry rendered in the Prometheus text
+# exposition format. Recording is a dict lookup plus a locked addition, so
+# it is cheap enough for every request, query and websocket message. Each
+# worker process keeps its own registry and is scraped separately.
+
+REGISTRY = []
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _format_labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{_escape(str(value))}"' for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{self._format_labels(values)} {_number(child.value)}']
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            lines.append(f'{self.name}_bucket{self._format_labels(values, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{self._format_labels(values)} {_number(total)}')
+        lines.append(f'{self.name}_count{self._format_labels(values)} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render():
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+http_requests = Counter(
+    'http_requests_total', 'HTTP requests handled.', ['method', 'route', 'status'])
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Time spent producing an HTTP response.', ['method', 'route'])
+http_request_queries = Histogram(
+    'http_request_db_queries', 'Database queries issued per HTTP request.', ['method', 'route'],
+    buckets=QUERY_COUNT_BUCKETS)
+http_request_query_time = Counter(
+    'http_request_db_seconds_total', 'Time spent in database queries by HTTP requests.', ['method', 'route'])
+
+websocket_connections = Gauge(
+    'websocket_connections_active', 'Open websocket connections.', ['consumer'])
+websocket_messages_received = Counter(
+    'websocket_messages_received_total', 'Websocket messages received from clients.', ['consumer'])
+websocket_messages_rejected = Counter(
+    'websocket_messages_rejected_total', 'Websocket messages dropped by rate limits or a full inbound queue.',
+    ['consumer', 'reason'])
+websocket_messages_sent = Counter(
+    'websocket_messages_sent_total', 'Websocket messages sent to clients.', ['consumer'])
+websocket_receive_duration = Histogram(
+    'websocket_receive_duration_seconds', 'Time spent handling an inbound websocket message.', ['consumer'])
+websocket_receive_queries = Histogram(
+    'websocket_receive_db_queries', 'Database queries issued per inbound websocket message.', ['consumer'],
+    buckets=QUERY_COUNT_BUCKETS)
+websocket_receive_query_time = Counter(
+    'websocket_receive_db_seconds_total', 'Time spent in database queries by websocket messages.', ['consumer'])
+
+group_sends = Counter(
+    'channel_layer_group_sends_total', 'Events sent to channel layer groups.', ['group'])
+group_send_duration = Histogram(
+    'channel_layer_group_send_duration_seconds', 'Time spent in channel layer group_send.', ['group'])
+
+watch_events_dropped = Counter(
+    'watch_events_dropped_total', 'Watch events discarded because the watch history queue was full.')
+
+
+class QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# The stats of the request or message being handled. Context variables are
+# copied into sync_to_async threads, so queries run there are attributed to
+# the request or message that awaited them.
+_query_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_recorder)
+
+
+@contextmanager
+def track_queries():
+    """Collect the number and duration of queries run within the block, on any thread."""
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def group_label(group):
+    """Collapse ``video_42`` into ``video`` so per-object groups share one series."""
+    return group.rsplit('_', 1)[0] if group.rsplit('_', 1)[-1].isdigit() else group
+
+
+async def timed_group_send(channel_layer, group, event):
+    label = group_label(group)
+    group_sends.labels(label).inc()
+    with group_send_duration.labels(label).time():
+        await channel_layer.group_send(group, event)
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Rating = apps.get_model('videoSharing', 'Rating')
+    Video = apps.get_model('videoSharing', 'Video')
+    totals = Rating.objects.values('video').annotate(total=Sum('score'), count=Count('id'))
+    for row in totals.iterator():
+        Video.objects.filter(pk=row['video']).update(rating_sum=row['total'], rating_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
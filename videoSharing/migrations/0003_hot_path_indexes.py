@@ -0,0 +1,81 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:56
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def _delete_duplicates(model, order_by):
+    duplicates = model.objects.values('user', 'video').annotate(rows=Count('id')).filter(rows__gt=1)
+    affected_videos = set()
+    for pair in duplicates.iterator():
+        ids = list(model.objects.filter(user=pair['user'], video=pair['video'])
+                   .order_by(*order_by).values_list('id', flat=True))
+        model.objects.filter(id__in=ids[1:]).delete()
+        affected_videos.add(pair['video'])
+    return affected_videos
+
+
+def deduplicate_user_video_rows(apps, schema_editor):
+    WatchHistory = apps.get_model('videoSharing', 'WatchHistory')
+    Rating = apps.get_model('videoSharing', 'Rating')
+    Video = apps.get_model('videoSharing', 'Video')
+
+    _delete_duplicates(WatchHistory, ['-watch_date', '-id'])
+    for video_id in _delete_duplicates(Rating, ['-created_at', '-id']):
+        totals = Rating.objects.filter(video=video_id).aggregate(total=Sum('score'), count=Count('id'))
+        Video.objects.filter(pk=video_id).update(
+            rating_sum=totals['total'],
+            rating_count=totals['count'],
+            average_rating=totals['total'] / totals['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0002_video_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['video', '-created_at'], name='comment_video_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-created_at', '-id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['end_date'], name='subscription_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-upload_date', '-id'], name='video_upload_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['video', '-watch_date'], name='watch_history_video_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['user', '-watch_date'], name='watch_history_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['-watch_date', '-id'], name='watch_history_date_idx'),
+        ),
+        migrations.RunPython(deduplicate_user_video_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_rating_user_video'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchhistory',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_watch_history_user_video'),
+        ),
+    ]
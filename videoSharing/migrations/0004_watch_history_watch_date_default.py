@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='watchhistory',
+            name='watch_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
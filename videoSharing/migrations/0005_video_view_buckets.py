@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0004_watch_history_watch_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='videoSharing.video')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket_start', 'video'), name='unique_view_bucket_start_video')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0005_video_view_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared', models.PositiveIntegerField(default=0)),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videoSharing.video')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='videoSharing.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['video', '-shared'], name='video_neighbor_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('video', 'neighbor'), name='unique_video_neighbor')],
+            },
+        ),
+    ]
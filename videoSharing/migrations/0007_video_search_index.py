@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than imported from videoSharing.search
+# so this migration keeps doing the same thing when that module changes.
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS videosharing_video_fts USING fts5("
+    "title, description, content='videoSharing_video', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    '''CREATE TRIGGER IF NOT EXISTS videosharing_video_fts_insert AFTER INSERT ON "videoSharing_video" BEGIN
+        INSERT INTO videosharing_video_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS videosharing_video_fts_delete AFTER DELETE ON "videoSharing_video" BEGIN
+        INSERT INTO videosharing_video_fts(videosharing_video_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS videosharing_video_fts_update
+    AFTER UPDATE OF title, description ON "videoSharing_video" BEGIN
+        INSERT INTO videosharing_video_fts(videosharing_video_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO videosharing_video_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''',
+    "INSERT INTO videosharing_video_fts(videosharing_video_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVE = [
+    'DROP TRIGGER IF EXISTS videosharing_video_fts_insert',
+    'DROP TRIGGER IF EXISTS videosharing_video_fts_delete',
+    'DROP TRIGGER IF EXISTS videosharing_video_fts_update',
+    'DROP TABLE IF EXISTS videosharing_video_fts',
+]
+
+POSTGRESQL_INSTALL = [
+    'CREATE INDEX IF NOT EXISTS video_search_idx ON "videoSharing_video" USING GIN '
+    "((setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', description), 'B')))",
+]
+
+POSTGRESQL_REMOVE = [
+    'DROP INDEX IF EXISTS video_search_idx',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_REMOVE),
+    'postgresql': (POSTGRESQL_INSTALL, POSTGRESQL_REMOVE),
+}
+
+
+def _run(schema_editor, index):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[index]:
+        schema_editor.execute(sql, params=None)
+
+
+def install(apps, schema_editor):
+    _run(schema_editor, 0)
+
+
+def remove(apps, schema_editor):
+    _run(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0006_video_neighbors'),
+    ]
+
+    operations = [
+        # An FTS5 table kept in sync by triggers on SQLite, a GIN index on a
+        # tsvector expression on PostgreSQL; nothing on other databases.
+        migrations.RunPython(install, remove),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Existing history keeps only the latest watch of each (user, video), so
+    # each row counts as one watch and one viewer on the day of that watch.
+    WatchHistory = apps.get_model('videoSharing', 'WatchHistory')
+    VideoDailyStats = apps.get_model('videoSharing', 'VideoDailyStats')
+    UserDailyStats = apps.get_model('videoSharing', 'UserDailyStats')
+    history = WatchHistory.objects.annotate(day=TruncDate('watch_date')).order_by()
+
+    for model, field, distinct in ((VideoDailyStats, 'video', 'viewers'), (UserDailyStats, 'user', 'videos')):
+        rows = history.values(field, 'day').annotate(count=Count('id'))
+        batch = []
+        for row in rows.iterator():
+            batch.append(model(**{f'{field}_id': row[field], 'day': row['day'],
+                                  'watches': row['count'], distinct: row['count']}))
+            if len(batch) == 1000:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0007_video_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('watches', models.PositiveIntegerField(default=0)),
+                ('videos', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_user_daily_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('watches', models.PositiveIntegerField(default=0)),
+                ('viewers', models.PositiveIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='videoSharing.video')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('video', 'day'), name='unique_video_daily_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
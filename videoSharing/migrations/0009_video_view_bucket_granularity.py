@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0008_watch_history_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='videoviewbucket',
+            name='unique_view_bucket_start_video',
+        ),
+        # Every existing bucket was written by the trending rankings.
+        migrations.AddField(
+            model_name='videoviewbucket',
+            name='granularity',
+            field=models.CharField(choices=[('trending', 'Trending'), ('hour', 'Hour'), ('day', 'Day')], default='trending', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='videoviewbucket',
+            constraint=models.UniqueConstraint(fields=('video', 'granularity', 'bucket_start'), name='unique_video_view_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='videoviewbucket',
+            index=models.Index(fields=['granularity', 'bucket_start'], name='video_view_bucket_age_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0009_video_view_bucket_granularity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['url'], name='video_url_idx'),
+        ),
+    ]
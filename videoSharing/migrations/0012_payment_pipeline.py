@@ -0,0 +1,81 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_legacy_payments_completed(apps, schema_editor):
+    # Payments charged synchronously were saved as 'successful', which is
+    # not one of the status choices.
+    Payment = apps.get_model('videoSharing', 'Payment')
+    Payment.objects.filter(status='successful').update(status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoSharing', '0011_subscription_active_end_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='error',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='purpose',
+            field=models.CharField(choices=[('upgrade', 'Upgrade or renewal'), ('renewal', 'Renewal')], default='upgrade', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['locked_until'], name='payment_open_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_payment_idempotency_key'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='outbox_unprocessed_idx'),
+        ),
+        migrations.RunPython(mark_legacy_payments_completed, migrations.RunPython.noop),
+    ]
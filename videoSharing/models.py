@@ -48,20 +48,77 @@ class Video(models.Model):
     url = models.URLField()
     view_count = models.PositiveIntegerField(default=0)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     is_premium = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-upload_date', '-id'], name='video_upload_date_idx'),
+            models.Index(fields=['url'], name='video_url_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
     def allowed_to_watch(self, user):
         if self.is_premium is False:
             return True
-        elif self.is_premium and user.subscription.subscription_type == 'premium':
+        elif self.is_premium and user.subscription.has_premium_access:
             return True
         else:
             return False
 
 
+class VideoViewBucket(models.Model):
+    """Views a video received during the bucket starting at ``bucket_start``.
+
+    Trending buckets last ``TRENDING['BUCKET_SECONDS']`` and are dropped once
+    they leave the longest window; hourly and daily buckets back the view
+    analytics and have their own retention.
+    """
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    granularity = models.CharField(max_length=10, choices=[
+        ('trending', 'Trending'),
+        ('hour', 'Hour'),
+        ('day', 'Day')
+    ])
+    bucket_start = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'granularity', 'bucket_start'],
+                                    name='unique_video_view_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='video_view_bucket_age_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.video_id} {self.granularity} @ {self.bucket_start}: {self.views}'
+
+
+class VideoNeighbor(models.Model):
+    """``shared`` users have watched both ``video`` and ``neighbor``."""
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+')
+    shared = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'neighbor'], name='unique_video_neighbor'),
+        ]
+        indexes = [
+            models.Index(fields=['video', '-shared'], name='video_neighbor_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.video_id} -> {self.neighbor_id}: {self.shared}'
+
+
 class Subscription(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     start_date = models.DateTimeField(auto_now_add=True)
@@ -72,6 +129,12 @@ class Subscription(models.Model):
         ('premium', 'Premium')
     ], default='free')
 
+    class Meta:
+        indexes = [
+            # Only what expire_subscriptions still has to visit.
+            models.Index(fields=['end_date'], condition=models.Q(is_active=True), name='subscription_active_end_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.end_date:
             self.end_date = timezone.now() + datetime.timedelta(days=30)
@@ -80,6 +143,10 @@ class Subscription(models.Model):
     def __str__(self):
         return f'Subscription of {self.user.email} - Active: {self.is_active}'
 
+    @property
+    def has_premium_access(self):
+        return self.is_active and self.subscription_type == 'premium'
+
     def renew_subscription(self):
         if not self.is_active:
             raise ValueError("Cannot renew an inactive subscription.")
@@ -92,41 +159,156 @@ class Subscription(models.Model):
         self.save()
 
     def check_subscription_status(self):
+        # expire_subscriptions deactivates ended subscriptions in bulk on a
+        # schedule; this only catches one that ended since its last run.
         if timezone.now() > self.end_date:
             self.is_active = False
             self.save()
 
 
+class WatchHistoryManager(models.Manager):
+    def upsert(self, entries):
+        """Insert or refresh ``(user_id, video_id, watch_date)`` entries in one statement."""
+        return self.bulk_create(
+            [self.model(user_id=user_id, video_id=video_id, watch_date=watch_date)
+             for user_id, video_id, watch_date in entries],
+            update_conflicts=True,
+            unique_fields=['user', 'video'],
+            update_fields=['watch_date'],
+        )
+
+
 class WatchHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    watch_date = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, which would overwrite the time of queued watch events.
+    watch_date = models.DateTimeField(default=timezone.now)
+
+    objects = WatchHistoryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='unique_watch_history_user_video'),
+        ]
+        indexes = [
+            models.Index(fields=['video', '-watch_date'], name='watch_history_video_date_idx'),
+            models.Index(fields=['user', '-watch_date'], name='watch_history_user_date_idx'),
+            models.Index(fields=['-watch_date', '-id'], name='watch_history_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} watched {self.video.title} on {self.watch_date}'
 
 
+class VideoDailyStats(models.Model):
+    """Watch events of a video on one day and how many users watched it that day."""
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    day = models.DateField()
+    watches = models.PositiveIntegerField(default=0)
+    viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'day'], name='unique_video_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f'{self.video_id} on {self.day}: {self.watches} watches'
+
+
+class UserDailyStats(models.Model):
+    """Watch events of a user on one day and how many distinct videos they covered."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    watches = models.PositiveIntegerField(default=0)
+    videos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_user_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} on {self.day}: {self.watches} watches'
+
+
 class Payment(models.Model):
+    PURPOSES = [
+        ('upgrade', 'Upgrade or renewal'),
+        ('renewal', 'Renewal'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    transaction_id = models.CharField(max_length=100)
+    # Supplied by the client, so a retried request finds its first payment
+    # instead of charging again.
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    purpose = models.CharField(max_length=20, choices=PURPOSES, default='upgrade')
+    transaction_id = models.CharField(max_length=100, blank=True, default='')
     status = models.CharField(max_length=50, choices=[
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed')
     ])
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # A pending payment is not retried before this time; a processing one is
+    # taken over by another worker once its lease runs out.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_payment_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+            models.Index(fields=['locked_until'], condition=models.Q(status__in=['pending', 'processing']),
+                         name='payment_open_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.status}"
 
 
+class OutboxEvent(models.Model):
+    """A change recorded in the same transaction as the state that caused it.
+
+    The payment worker relays unprocessed events to their handler and marks
+    them processed in the handler's transaction, so each is applied once.
+    """
+
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='outbox_unprocessed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} #{self.pk}'
+
+
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     video = models.ForeignKey('Video', on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['video', '-created_at'], name='comment_video_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='comment_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.user.username} on {self.video.title}'
 
@@ -137,5 +319,10 @@ class Rating(models.Model):
     score = models.DecimalField(max_digits=2, decimal_places=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='unique_rating_user_video'),
+        ]
+
     def __str__(self):
         return f'Rating by {self.user.username} on {self.video.title} - Score: {self.score}'
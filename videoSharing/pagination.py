@@ -0,0 +1,63 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class TimelineCursorPagination(CursorPagination):
+    page_size = settings.PAGINATION['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PAGINATION['MAX_PAGE_SIZE']
+
+
+class CommentCursorPagination(TimelineCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class WatchHistoryCursorPagination(TimelineCursorPagination):
+    ordering = ('-watch_date', '-id')
+
+
+class VideoCursorPagination(TimelineCursorPagination):
+    ordering = ('-upload_date', '-id')
+
+
+class PaymentCursorPagination(TimelineCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class VideoSearchPagination(LimitOffsetPagination):
+    """Limit/offset pages over ranked search results without counting every match.
+
+    ``paginate`` asks ``fetch(limit, offset)`` for one row more than the page
+    to learn whether a next page exists.
+    """
+
+    default_limit = settings.PAGINATION['PAGE_SIZE']
+    max_limit = settings.PAGINATION['MAX_PAGE_SIZE']
+
+    def paginate(self, request, fetch):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(fetch(self.limit + 1, self.offset))
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, self.limit)
+        if self.offset - self.limit <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, self.offset - self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
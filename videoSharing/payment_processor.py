@@ -1,5 +1,70 @@
+import itertools
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class PaymentDeclined(Exception):
+    """The gateway refused the charge; retrying will not help."""
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or failed; the charge may be retried."""
+
+
 class PaymentProcessor:
-    def create_payment(self, user, amount):
-        # Simulate a successful payment process for now
-        print(f"Processing payment of ${amount} for user {user.email}")
-        return True
+    """Interface of a payment gateway client.
+
+    ``charge`` must be idempotent on ``idempotency_key``: charging again with
+    a key the gateway has already seen returns the original transaction id
+    instead of charging twice, which is what makes worker retries safe.
+    """
+
+    def charge(self, amount, idempotency_key, customer):
+        """Charge ``amount`` to ``customer`` and return the gateway transaction id.
+
+        Raises ``PaymentDeclined`` or ``GatewayError``.
+        """
+        raise NotImplementedError
+
+
+class FakePaymentGateway(PaymentProcessor):
+    """In-process gateway for development and tests.
+
+    Sleeps ``latency`` seconds per call, declines amounts above
+    ``decline_over`` and fails every ``fail_every``-th call with a
+    ``GatewayError``. Charges are remembered per idempotency key for the
+    life of the process.
+    """
+
+    _charges = {}
+    _lock = threading.Lock()
+    _calls = itertools.count(1)
+
+    def __init__(self, latency=0, decline_over=None, fail_every=None):
+        self.latency = latency
+        self.decline_over = None if decline_over is None else Decimal(decline_over)
+        self.fail_every = fail_every
+
+    def charge(self, amount, idempotency_key, customer):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if idempotency_key in self._charges:
+                return self._charges[idempotency_key]
+            if self.fail_every and next(self._calls) % self.fail_every == 0:
+                raise GatewayError('Gateway timed out.')
+            if self.decline_over is not None and Decimal(amount) > self.decline_over:
+                raise PaymentDeclined('Card declined.')
+            transaction_id = f'fake_{uuid.uuid4().hex}'
+            self._charges[idempotency_key] = transaction_id
+            return transaction_id
+
+
+def get_payment_processor():
+    config = settings.PAYMENTS
+    return import_string(config['PROCESSOR'])(**config['PROCESSOR_OPTIONS'])
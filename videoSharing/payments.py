@@ -0,0 +1,135 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEvent, Payment, Subscription
+from .payment_processor import GatewayError, PaymentDeclined
+
+logger = logging.getLogger(__name__)
+
+# Payments are charged off the request path. A request only records a
+# pending Payment under the client's idempotency key; process_payments
+# claims pending payments, charges the gateway with a key derived from the
+# payment, and in one transaction marks the payment completed and writes a
+# 'payment.completed' OutboxEvent. Relaying that event applies the
+# subscription change and marks it processed in one transaction, so a crash
+# at any point is retried without charging or extending twice.
+
+SUBSCRIPTION_PERIOD = datetime.timedelta(days=30)
+
+
+class IdempotencyConflict(ValueError):
+    """The idempotency key was already used for a different payment."""
+
+
+def enqueue_payment(user_id, amount, idempotency_key, purpose):
+    """Record a pending payment and return ``(payment, created)``.
+
+    Repeating a request with the same key returns the payment it created.
+    """
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(user_id=user_id, amount=amount, idempotency_key=idempotency_key,
+                                             purpose=purpose, status='pending')
+        return payment, True
+    except IntegrityError:
+        payment = Payment.objects.get(user_id=user_id, idempotency_key=idempotency_key)
+        if payment.amount != amount or payment.purpose != purpose:
+            raise IdempotencyConflict(idempotency_key)
+        return payment, False
+
+
+def claim_payments(batch_size, now=None):
+    """Lease up to ``batch_size`` payments that are due to be charged to this worker."""
+    now = timezone.now() if now is None else now
+    lease = datetime.timedelta(seconds=settings.PAYMENTS['LEASE_SECONDS'])
+    with transaction.atomic():
+        ids = list(Payment.objects.select_for_update(skip_locked=True)
+                   .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now),
+                           status__in=['pending', 'processing'])
+                   .order_by('id')
+                   .values_list('id', flat=True)[:batch_size])
+        Payment.objects.filter(pk__in=ids).update(status='processing', locked_until=now + lease,
+                                                  attempts=F('attempts') + 1)
+    return list(Payment.objects.filter(pk__in=ids).order_by('id'))
+
+
+def _finish(payment, **changes):
+    """Apply ``changes`` to ``payment`` unless another worker has taken over its lease."""
+    with transaction.atomic():
+        finished = Payment.objects.filter(pk=payment.pk, status='processing', attempts=payment.attempts) \
+            .update(**changes)
+        if finished and changes['status'] == 'completed':
+            OutboxEvent.objects.create(topic='payment.completed', payload={'payment_id': payment.pk})
+    return bool(finished)
+
+
+def charge_payment(payment, processor):
+    """Charge a claimed payment and return its new status."""
+    config = settings.PAYMENTS
+    try:
+        transaction_id = processor.charge(payment.amount, f'payment-{payment.pk}', payment.user_id)
+    except PaymentDeclined as e:
+        _finish(payment, status='failed', locked_until=None, error=str(e)[:255])
+        return 'failed'
+    except GatewayError as e:
+        if payment.attempts >= config['MAX_ATTEMPTS']:
+            _finish(payment, status='failed', locked_until=None, error=str(e)[:255])
+            return 'failed'
+        backoff = config['RETRY_BACKOFF'] * 2 ** (payment.attempts - 1)
+        _finish(payment, status='pending', locked_until=timezone.now() + datetime.timedelta(seconds=backoff),
+                error=str(e)[:255])
+        return 'pending'
+    _finish(payment, status='completed', transaction_id=transaction_id, locked_until=None, error='')
+    return 'completed'
+
+
+def apply_completed_payment(payload):
+    payment = Payment.objects.get(pk=payload['payment_id'])
+    subscription = Subscription.objects.select_for_update().filter(user_id=payment.user_id).first()
+    if subscription is None:
+        logger.warning('Payment %s completed for user %s, who has no subscription', payment.pk, payment.user_id)
+        return
+
+    now = timezone.now()
+    if payment.purpose == 'upgrade' and subscription.subscription_type == 'free':
+        subscription.subscription_type = 'premium'
+        subscription.start_date = now
+        subscription.end_date = now + SUBSCRIPTION_PERIOD
+    else:
+        # A subscription that expired while the payment was queued restarts
+        # from today rather than from its old end date.
+        subscription.end_date = max(subscription.end_date, now) + SUBSCRIPTION_PERIOD
+    subscription.is_active = True
+    subscription.save()
+
+
+OUTBOX_HANDLERS = {
+    'payment.completed': apply_completed_payment,
+}
+
+
+def relay_outbox(batch_size):
+    """Apply up to ``batch_size`` unprocessed outbox events; return how many were applied."""
+    ids = list(OutboxEvent.objects.filter(processed_at__isnull=True, attempts__lt=settings.PAYMENTS['MAX_ATTEMPTS'])
+               .order_by('id').values_list('id', flat=True)[:batch_size])
+    applied = 0
+    for event_id in ids:
+        try:
+            with transaction.atomic():
+                event = OutboxEvent.objects.select_for_update(skip_locked=True) \
+                    .filter(pk=event_id, processed_at__isnull=True).first()
+                if event is None:
+                    continue
+                OUTBOX_HANDLERS[event.topic](event.payload)
+                event.processed_at = timezone.now()
+                event.save(update_fields=['processed_at'])
+            applied += 1
+        except Exception as e:
+            logger.exception('Outbox event %s failed', event_id)
+            OutboxEvent.objects.filter(pk=event_id).update(attempts=F('attempts') + 1, last_error=str(e))
+    return applied
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class TokenBucket:
+    """Allow ``rate`` events per second on average and bursts of up to ``burst``."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def full_at(self):
+        return self.updated + (self.burst - self.tokens) / self.rate
+
+
+class MemoryRateLimiter:
+    """Token buckets kept in this process, so each worker enforces its own limit."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._calls = 0
+
+    def allow(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            allowed = bucket.take(now)
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                # A bucket that has refilled is the same as no bucket.
+                self._buckets = {k: b for k, b in self._buckets.items() if b.full_at() > now}
+            return allowed
+
+    async def aallow(self, key, rate, burst):
+        return self.allow(key, rate, burst)
+
+
+class RedisRateLimiter:
+    """Token buckets shared by every worker through Redis.
+
+    Each bucket is a ``rate_limit:<key>`` hash refilled and drawn from by one
+    Lua script, so concurrent workers cannot both spend the last token. The
+    hash expires once the bucket would be full again.
+    """
+
+    KEY = 'rate_limit:{}'
+    SCRIPT = '''
+        local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens, updated = tonumber(state[1]), tonumber(state[2])
+        if tokens == nil then
+            tokens, updated = burst, now
+        end
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+        return allowed
+    '''
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._script = None
+
+    @property
+    def redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def allow(self, key, rate, burst):
+        if self._script is None:
+            self._script = self.redis.register_script(self.SCRIPT)
+        return bool(self._script(keys=[self.KEY.format(key)], args=[rate, burst, time.time()]))
+
+    async def aallow(self, key, rate, burst):
+        # A Redis round trip; keep it off the thread that runs database work.
+        return await sync_to_async(self.allow, thread_sensitive=False)(key, rate, burst)
+
+
+_BACKENDS = {
+    'memory': MemoryRateLimiter,
+    'redis': RedisRateLimiter,
+}
+
+
+def _build_limiter():
+    config = settings.WEBSOCKET_RATE_LIMIT
+    return _BACKENDS[config.get('BACKEND', 'memory')](**config.get('OPTIONS', {}))
+
+
+user_rate_limiter = _build_limiter()
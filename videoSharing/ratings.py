@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+from .models import Rating, Video
+from .response_cache import invalidate_videos
+
+AVERAGE_QUANTUM = Decimal('0.01')
+
+
+def average_of(rating_sum, rating_count):
+    if not rating_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / rating_count).quantize(AVERAGE_QUANTUM)
+
+
+def apply_rating_delta(video_id, delta_sum, delta_count):
+    """Fold a change in one video's ratings into its running totals.
+
+    The sum, the count and the derived average are updated in a single
+    UPDATE built from F() expressions, so concurrent votes never overwrite
+    each other and no other Video column is rewritten.
+    """
+    new_sum = F('rating_sum') + Decimal(delta_sum)
+    new_count = F('rating_count') + delta_count
+    Video.objects.filter(pk=video_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        average_rating=Case(
+            When(GreaterThan(new_count, 0), then=Cast(new_sum, FloatField()) / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+    transaction.on_commit(lambda: invalidate_videos([video_id]), robust=True)
+
+
+def rate_video(user_id, video_id, score):
+    """Create or replace ``user_id``'s rating of ``video_id`` and return the new average.
+
+    The rating row is locked, or created, before the totals move. When two
+    first votes race, the unique constraint lets only one of them create
+    the row; the other waits for it and is applied as a change of score.
+    """
+    score = Decimal(str(score))
+    with transaction.atomic():
+        rating, created = Rating.objects.select_for_update().get_or_create(
+            user_id=user_id, video_id=video_id, defaults={'score': score},
+        )
+        if created:
+            apply_rating_delta(video_id, score, 1)
+        elif rating.score != score:
+            apply_rating_delta(video_id, score - rating.score, 0)
+            rating.score = score
+            rating.save(update_fields=['score'])
+    return Video.objects.values_list('average_rating', flat=True).get(pk=video_id)
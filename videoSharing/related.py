@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import VideoNeighbor, WatchHistory
+from .rollups import increment_counters
+
+
+def apply_neighbor_counts(counts, chunk_size=500):
+    """Add ``{(video_id, neighbor_id): shared}`` to the neighbor table, creating missing pairs."""
+    with transaction.atomic():
+        increment_counters(VideoNeighbor, ('video_id', 'neighbor_id'),
+                           {pair: {'shared': amount} for pair, amount in counts.items()}, chunk_size)
+
+
+def recent_videos_by_user(user_ids, per_user):
+    """Return ``{user_id: [video_id, ...]}`` with each user's ``per_user`` latest watches."""
+    rows = (WatchHistory.objects.filter(user_id__in=user_ids)
+            .annotate(position=Window(RowNumber(), partition_by=F('user'), order_by=F('watch_date').desc()))
+            .filter(position__lte=per_user)
+            .values_list('user_id', 'video_id'))
+    recent = defaultdict(list)
+    for user_id, video_id in rows:
+        recent[user_id].append(video_id)
+    return recent
+
+
+def record_co_watches(new_pairs):
+    """Count each first watch in ``new_pairs`` as shared with the user's recent videos.
+
+    ``new_pairs`` must be computed before the watches are written, so a
+    video is paired only with videos the user had already watched and with
+    the new videos that precede it in the batch.
+    """
+    by_user = defaultdict(list)
+    for user_id, video_id in new_pairs:
+        by_user[user_id].append(video_id)
+    if not by_user:
+        return
+
+    recent = recent_videos_by_user(by_user, settings.RELATED_VIDEOS['INCREMENTAL_HISTORY'])
+    counts = defaultdict(int)
+    for user_id, videos in by_user.items():
+        seen = [video_id for video_id in recent.get(user_id, []) if video_id not in videos]
+        for video_id in videos:
+            for other in seen:
+                counts[(video_id, other)] += 1
+                counts[(other, video_id)] += 1
+            seen.append(video_id)
+    apply_neighbor_counts(counts)
+
+
+def related_videos(video_id, limit):
+    """Return up to ``limit`` videos most often watched by viewers of ``video_id``.
+
+    Each video carries the number of viewers it shares with ``video_id`` as
+    ``shared_viewers``.
+    """
+    neighbors = (VideoNeighbor.objects.filter(video_id=video_id, shared__gte=settings.RELATED_VIDEOS['MIN_SHARED'])
+                 .select_related('neighbor').order_by('-shared', 'neighbor_id')[:limit])
+    videos = []
+    for row in neighbors:
+        row.neighbor.shared_viewers = row.shared
+        videos.append(row.neighbor)
+    return videos
+
+
+def replace_neighbors(low, high, rows):
+    """Replace the neighbors of every video with ``low < id <= high`` by ``rows``.
+
+    ``rows`` are ``(video_id, neighbor_id, shared)`` tuples; ``high`` may be
+    None for no upper bound.
+    """
+    videos = Q(video_id__gt=low) if high is None else Q(video_id__gt=low, video_id__lte=high)
+    with transaction.atomic():
+        VideoNeighbor.objects.filter(videos).delete()
+        VideoNeighbor.objects.bulk_create(
+            [VideoNeighbor(video_id=video_id, neighbor_id=neighbor_id, shared=shared)
+             for video_id, neighbor_id, shared in rows],
+            batch_size=1000,
+        )
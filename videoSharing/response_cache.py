@@ -0,0 +1,102 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'version:catalog'
+VIDEO_VERSION_KEY = 'version:video:{}'
+COMMENTS_VERSION_KEY = 'version:comments'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version that was evicted from the cache
+        # never comes back with a number that older entries were keyed on.
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache.set(f'{key}:modified', time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
+
+
+def version_modified(key):
+    """Return when ``key`` was last bumped, or None if that is not known."""
+    timestamp = cache.get(f'{key}:modified')
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+def catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def video_version(video_id):
+    return get_version(VIDEO_VERSION_KEY.format(video_id))
+
+
+def comments_version():
+    return get_version(COMMENTS_VERSION_KEY)
+
+
+def invalidate_comments():
+    bump_version(COMMENTS_VERSION_KEY)
+
+
+def invalidate_videos(video_ids, catalog=True):
+    """Invalidate the cached detail of each video and, unless told otherwise, the catalog."""
+    for video_id in video_ids:
+        bump_version(VIDEO_VERSION_KEY.format(video_id))
+    if catalog:
+        bump_version(CATALOG_VERSION_KEY)
+
+
+def query_digest(query_string):
+    return hashlib.md5(query_string.encode(), usedforsecurity=False).hexdigest()
+
+
+def video_list_key(query_string):
+    return f'video:list:{catalog_version()}:{query_digest(query_string)}'
+
+
+def video_detail_key(video_id):
+    return f'video:detail:{video_id}:{video_version(video_id)}'
+
+
+def get_or_build(key, build, timeout=None):
+    """Return the cached value for ``key``, building it at most once across workers.
+
+    The first caller to miss takes a short-lived lock and builds the value;
+    concurrent callers poll for it for up to ``LOCK_TIMEOUT`` seconds
+    before giving up and building it themselves.
+    """
+    config = settings.RESPONSE_CACHE
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, config['LOCK_TIMEOUT']):
+        try:
+            value = build()
+            cache.set(key, value, timeout or config['TIMEOUT'])
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + config['LOCK_TIMEOUT']
+    while time.monotonic() < deadline:
+        time.sleep(config['POLL_INTERVAL'])
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return build()
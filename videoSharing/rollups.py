@@ -0,0 +1,115 @@
+import datetime
+import json
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import WatchHistory
+
+
+def bucket_start(timestamp, bucket_seconds):
+    """Return the epoch second at which the bucket holding ``timestamp`` starts."""
+    timestamp = int(timestamp)
+    return timestamp - timestamp % bucket_seconds
+
+
+def from_epoch(epoch):
+    return datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
+
+
+def increment_counters(model, key_fields, increments, chunk_size=500, create=True):
+    """Add ``{key: {field: amount}}`` to the ``model`` rows identified by ``key_fields``.
+
+    Missing rows are created first unless ``create`` is false, then rows that
+    receive the same amounts are updated together, so a batch costs a handful
+    of statements however many rows it touches. Run it inside a transaction.
+    """
+    by_amounts = defaultdict(list)
+    for key, amounts in increments.items():
+        amounts = tuple(sorted((field, amount) for field, amount in amounts.items() if amount))
+        if amounts:
+            by_amounts[amounts].append(key)
+
+    if create:
+        model.objects.bulk_create([model(**dict(zip(key_fields, key))) for key in increments],
+                                  ignore_conflicts=True, batch_size=chunk_size)
+    for amounts, keys in by_amounts.items():
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            if len(key_fields) == 1:
+                condition = Q(**{f'{key_fields[0]}__in': [key for key, in chunk]})
+            else:
+                condition = reduce(or_, (Q(**dict(zip(key_fields, key))) for key in chunk))
+            model.objects.filter(condition).update(**{field: F(field) + amount for field, amount in amounts})
+
+
+def previous_watch_dates(pairs):
+    """Return ``{(user_id, video_id): watch_date}`` of the stored history of ``pairs``."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    rows = WatchHistory.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        video_id__in={video_id for _, video_id in pairs},
+    ).values_list('user_id', 'video_id', 'watch_date')
+    return {(user_id, video_id): watch_date for user_id, video_id, watch_date in rows
+            if (user_id, video_id) in pairs}
+
+
+def daily_rollups(events, previous):
+    """Aggregate watch events into per-video and per-user daily increments.
+
+    ``previous`` holds the watch date stored for each pair before these
+    events; a user counts as a new viewer of a video on a day unless they
+    had already watched it that day.
+    """
+    videos = defaultdict(lambda: {'watches': 0, 'viewers': 0})
+    users = defaultdict(lambda: {'watches': 0, 'videos': 0})
+    counted = set()
+    for user_id, video_id, watch_date in events:
+        day = timezone.localdate(watch_date)
+        videos[(video_id, day)]['watches'] += 1
+        users[(user_id, day)]['watches'] += 1
+
+        before = previous.get((user_id, video_id))
+        if (user_id, video_id, day) not in counted and (before is None or timezone.localdate(before) < day):
+            counted.add((user_id, video_id, day))
+            videos[(video_id, day)]['viewers'] += 1
+            users[(user_id, day)]['videos'] += 1
+    return videos, users
+
+
+def _archive_rows(archive, rows):
+    for pk, user_id, video_id, watch_date in rows:
+        archive.write(json.dumps({'id': pk, 'user': user_id, 'video': video_id,
+                                  'watch_date': watch_date.isoformat()}) + '\n')
+
+
+def delete_expired_watch_history(cutoff, batch_size=1000, pause=0, archive=None, progress=None):
+    """Delete WatchHistory rows last watched before ``cutoff``, ``batch_size`` at a time.
+
+    Each batch is a single DELETE by primary key in its own short
+    transaction, with ``pause`` seconds between batches so writers are not
+    starved. Rows are written to the ``archive`` file object as NDJSON
+    before they are deleted. Returns the number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        rows = list(WatchHistory.objects.filter(watch_date__lt=cutoff)
+                    .order_by('watch_date', 'id')
+                    .values_list('id', 'user_id', 'video_id', 'watch_date')[:batch_size])
+        if not rows:
+            return deleted
+        if archive is not None:
+            _archive_rows(archive, rows)
+        # A row watched again since it was read has moved past the cutoff.
+        count, _ = WatchHistory.objects.filter(pk__in=[row[0] for row in rows], watch_date__lt=cutoff).delete()
+        deleted += count
+        if progress is not None:
+            progress(deleted)
+        if pause:
+            time.sleep(pause)
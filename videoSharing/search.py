@@ -0,0 +1,114 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Video
+
+# Full-text search over video titles and descriptions. SQLite keeps an FTS5
+# index that triggers update on every write to the video table; PostgreSQL
+# uses a GIN index over a weighted tsvector expression. Titles weigh more
+# than descriptions in the ranking, and every search term matches as a
+# prefix so results show up while the user is still typing.
+
+VIDEO_TABLE = 'videoSharing_video'
+FTS_TABLE = 'videosharing_video_fts'
+PG_INDEX = 'video_search_idx'
+PG_VECTOR = ("(setweight(to_tsvector('english', {alias}title), 'A') || "
+             "setweight(to_tsvector('english', {alias}description), 'B'))")
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON "{VIDEO_TABLE}" BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END''',
+    f'{FTS_TABLE}_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON "{VIDEO_TABLE}" BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END''',
+    f'{FTS_TABLE}_update': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, description ON "{VIDEO_TABLE}" BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END''',
+}
+
+
+def install_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"title, description, content='{VIDEO_TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON "{VIDEO_TABLE}" '
+                           f'USING GIN ({PG_VECTOR.format(alias="")})')
+
+
+def remove_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+
+
+def repair_search_triggers(connection):
+    """Recreate the SQLite triggers and reindex if a table rebuild dropped them.
+
+    SQLite migrations that alter the video table copy it into a new table,
+    which silently drops the triggers attached to the old one.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name = %s OR name LIKE %s",
+                       [FTS_TABLE, f'{FTS_TABLE}_%'])
+        present = {name for _, name in cursor.fetchall()}
+    if FTS_TABLE not in present or present.issuperset(SQLITE_TRIGGERS):
+        return False
+    install_search_index(connection)
+    return True
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_videos(query, limit, offset=0):
+    """Return up to ``limit`` videos matching every term of ``query``, best match first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return list(Video.objects.raw(
+            f'SELECT v.* FROM {FTS_TABLE} JOIN "{VIDEO_TABLE}" v ON v.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), v.id DESC LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        ))
+
+    if connection.vendor == 'postgresql':
+        vector = PG_VECTOR.format(alias='v.')
+        return list(Video.objects.raw(
+            f'SELECT v.* FROM "{VIDEO_TABLE}" v, to_tsquery(\'english\', %s) query '
+            f'WHERE {vector} @@ query '
+            f'ORDER BY ts_rank_cd({vector}, query) DESC, v.id DESC LIMIT %s OFFSET %s',
+            [' & '.join(f'{term}:*' for term in terms), limit, offset],
+        ))
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(description__icontains=term)
+    return list(Video.objects.filter(condition).order_by('-upload_date', '-id')[offset:offset + limit])
@@ -1,9 +1,14 @@
 from django.utils import timezone
 import datetime
+from decimal import Decimal
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
+
 from .models import Video, Subscription, WatchHistory, Payment, Comment, Rating
+from .response_cache import invalidate_videos
 
 User = get_user_model()
 
@@ -34,22 +39,53 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'subscription_type', 'subscription_status']
 
 
+class VideoListSerializer(serializers.ListSerializer):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', settings.VIDEO_IMPORT['MAX_BATCH'])
+        super().__init__(*args, **kwargs)
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            videos = Video.objects.bulk_create([Video(**item) for item in validated_data])
+            video_ids = [video.pk for video in videos]
+            transaction.on_commit(lambda: invalidate_videos(video_ids), robust=True)
+        return videos
+
+
 class VideoSerializer(serializers.ModelSerializer):
-    average_rating = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
-    watch_history = serializers.SerializerMethodField()
-    comments = serializers.SerializerMethodField()
+    average_rating = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
 
     class Meta:
         model = Video
-        fields = ['id', 'title', 'description', 'upload_date', 'url', 'view_count', 'average_rating', 'is_premium', 'watch_history', 'comments']
+        fields = ['id', 'title', 'description', 'upload_date', 'url', 'view_count', 'average_rating', 'is_premium']
+        # Maintained by the view counter and the rating totals.
+        read_only_fields = ['view_count']
+        list_serializer_class = VideoListSerializer
+
+
+class TrendingVideoSerializer(VideoSerializer):
+    trending_views = serializers.IntegerField(read_only=True)
+
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['trending_views']
 
-    def get_watch_history(self, obj):
-        watch_history = WatchHistory.objects.filter(video=obj)
-        return WatchHistorySerializer(watch_history, many=True).data
+
+class RelatedVideoSerializer(VideoSerializer):
+    shared_viewers = serializers.IntegerField(read_only=True)
+
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['shared_viewers']
+
+
+class VideoDetailSerializer(VideoSerializer):
+    comment_count = serializers.IntegerField(read_only=True)
+    comments = serializers.SerializerMethodField()
+
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['comment_count', 'comments']
 
     def get_comments(self, obj):
-        comments = Comment.objects.filter(video=obj)
-        return CommentSerializer(comments, many=True).data
+        return CommentSerializer(obj.latest_comments, many=True).data
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -67,7 +103,14 @@ class WatchHistorySerializer(serializers.ModelSerializer):
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
-        fields = ['amount', 'transaction_id', 'status', 'created_at']
+        fields = ['id', 'amount', 'purpose', 'transaction_id', 'status', 'created_at']
+
+
+class PaymentRequestSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    idempotency_key = serializers.CharField(max_length=100, error_messages={
+        'null': 'Send an Idempotency-Key header or an idempotency_key field.',
+    })
 
 
 class CommentSerializer(serializers.ModelSerializer):
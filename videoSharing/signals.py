@@ -0,0 +1,37 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .entitlements import invalidate_entitlement
+from .models import Comment, Subscription, Video
+from .response_cache import invalidate_comments, invalidate_videos
+from .search import repair_search_triggers
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_entitlement(instance.user_id), robust=True)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def video_changed(sender, instance, **kwargs):
+    video_id = instance.pk
+    transaction.on_commit(lambda: invalidate_videos([video_id]), robust=True)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    def invalidate():
+        invalidate_videos([instance.video_id], catalog=False)
+        invalidate_comments()
+
+    transaction.on_commit(invalidate, robust=True)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'videoSharing':
+        repair_search_triggers(connections[using])
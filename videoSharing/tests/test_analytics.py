@@ -0,0 +1,44 @@
+import datetime
+
+from django.test import TestCase
+
+from videoSharing.analytics import prune_view_series, record_view_series, view_series
+from videoSharing.models import Video, VideoViewBucket
+
+
+class ViewSeriesTests(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1')
+        self.start = datetime.datetime(2026, 10, 10, tzinfo=datetime.timezone.utc)
+
+    def record(self, hours, views):
+        record_view_series({self.video.pk: views}, (self.start + datetime.timedelta(hours=hours)).timestamp())
+
+    def test_views_are_added_to_hourly_and_daily_buckets(self):
+        self.record(0, 2)
+        self.record(0.5, 3)
+        self.record(2, 1)
+        self.record(25, 4)
+        end = self.start + datetime.timedelta(hours=4)
+        self.assertEqual([views for _, views in view_series(self.video.pk, 'hour', self.start, end)], [5, 0, 1, 0])
+        self.assertEqual(view_series(self.video.pk, 'day', self.start, self.start + datetime.timedelta(days=2)),
+                         [(self.start, 6), (self.start + datetime.timedelta(days=1), 4)])
+
+    def test_points_sum_adjacent_buckets(self):
+        for hour in range(6):
+            self.record(hour, hour + 1)
+        end = self.start + datetime.timedelta(hours=6)
+        self.assertEqual([views for _, views in view_series(self.video.pk, 'hour', self.start, end, points=3)],
+                         [3, 7, 11])
+
+    def test_pruning_keeps_daily_and_trending_buckets(self):
+        self.record(0, 1)
+        self.record(30, 1)
+        VideoViewBucket.objects.create(video=self.video, granularity='trending', bucket_start=self.start, views=1)
+        self.assertEqual(prune_view_series('hour', self.start + datetime.timedelta(days=1), batch_size=1), 1)
+        self.assertEqual(sorted(VideoViewBucket.objects.values_list('granularity', flat=True)),
+                         ['day', 'day', 'hour', 'trending'])
+
+    def test_endpoint_rejects_unknown_granularity(self):
+        response = self.client.get(f'/api/video/{self.video.pk}/analytics/?granularity=minute')
+        self.assertEqual(response.status_code, 400)
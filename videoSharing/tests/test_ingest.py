@@ -0,0 +1,30 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from videoSharing.ingest import InvalidRow, clean_row
+from videoSharing.models import Video
+
+
+class CleanRowTests(TestCase):
+    def test_valid_row(self):
+        row = {'title': ' Video ', 'description': 'A video', 'url': 'https://example.com/1', 'is_premium': 'no'}
+        self.assertEqual(clean_row(row), {'title': 'Video', 'description': 'A video',
+                                          'url': 'https://example.com/1', 'is_premium': False})
+
+    def test_non_string_fields_are_invalid(self):
+        for field, value in (('title', 5), ('url', ['https://example.com/1']), ('description', {'text': 'x'})):
+            row = {'title': 'Video', 'url': 'https://example.com/1', field: value}
+            with self.subTest(field), self.assertRaisesMessage(InvalidRow, f'{field}: expected a string'):
+                clean_row(row)
+
+    def test_import_reports_bad_rows_and_keeps_going(self):
+        feed = io.StringIO('{"title": 5, "url": "https://example.com/1"}\n'
+                           '{"title": "Video", "url": "https://example.com/2"}\n')
+        stderr = io.StringIO()
+        with mock.patch('sys.stdin', feed):
+            call_command('import_videos', '-', format='jsonl', stdout=io.StringIO(), stderr=stderr)
+        self.assertIn('Line 1: title: expected a string, got int', stderr.getvalue())
+        self.assertEqual(list(Video.objects.values_list('url', flat=True)), ['https://example.com/2'])
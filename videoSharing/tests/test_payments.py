@@ -0,0 +1,104 @@
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from videoSharing.models import OutboxEvent, Payment, Subscription, User
+from videoSharing.payment_processor import GatewayError, PaymentDeclined, PaymentProcessor
+from videoSharing.payments import IdempotencyConflict, charge_payment, claim_payments, enqueue_payment, \
+    relay_outbox
+
+
+class ScriptedProcessor(PaymentProcessor):
+    """Answers each charge with the next outcome; an exception instance is raised."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.keys = []
+
+    def charge(self, amount, idempotency_key, customer):
+        self.keys.append(idempotency_key)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class PaymentPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('payer@example.com', 'payer', 'password')
+        self.subscription = Subscription.objects.create(user=self.user, subscription_type='free')
+
+    def charge_next(self, processor):
+        (payment,) = claim_payments(10)
+        return payment, charge_payment(payment, processor)
+
+    def test_enqueue_is_idempotent(self):
+        payment, created = enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'upgrade')
+        again, created_again = enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'upgrade')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.pk, payment.pk)
+        with self.assertRaises(IdempotencyConflict):
+            enqueue_payment(self.user.pk, Decimal('19.99'), 'key-1', 'upgrade')
+
+    def test_completed_payment_is_applied_once_through_the_outbox(self):
+        enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'upgrade')
+        processor = ScriptedProcessor('txn-1')
+        payment, outcome = self.charge_next(processor)
+
+        self.assertEqual(outcome, 'completed')
+        self.assertEqual(processor.keys, [f'payment-{payment.pk}'])
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id), ('completed', 'txn-1'))
+        self.assertEqual(OutboxEvent.objects.get().payload, {'payment_id': payment.pk})
+
+        self.assertEqual(relay_outbox(10), 1)
+        self.assertEqual(relay_outbox(10), 0)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.subscription_type, 'premium')
+        self.assertTrue(self.subscription.is_active)
+        self.assertIsNotNone(OutboxEvent.objects.get().processed_at)
+
+    def test_renewal_of_expired_subscription_restarts_from_today(self):
+        self.subscription.end_date = timezone.now() - datetime.timedelta(days=10)
+        self.subscription.save()
+        enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'renewal')
+        self.charge_next(ScriptedProcessor('txn-1'))
+        relay_outbox(10)
+        self.subscription.refresh_from_db()
+        self.assertGreater(self.subscription.end_date, timezone.now() + datetime.timedelta(days=29))
+
+    def test_gateway_error_is_retried_after_a_backoff(self):
+        enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'upgrade')
+        payment, outcome = self.charge_next(ScriptedProcessor(GatewayError('timeout')))
+
+        self.assertEqual(outcome, 'pending')
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+        self.assertGreater(payment.locked_until, timezone.now())
+        self.assertEqual(claim_payments(10), [])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        (retried,) = claim_payments(10, now=payment.locked_until)
+        self.assertEqual(charge_payment(retried, ScriptedProcessor('txn-1')), 'completed')
+        self.assertEqual(Payment.objects.get().attempts, 2)
+
+    def test_declined_payment_fails_without_an_event(self):
+        enqueue_payment(self.user.pk, Decimal('9.99'), 'key-1', 'upgrade')
+        payment, outcome = self.charge_next(ScriptedProcessor(PaymentDeclined('declined')))
+
+        self.assertEqual(outcome, 'failed')
+        self.assertEqual(Payment.objects.get().status, 'failed')
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(claim_payments(10), [])
+
+    def test_failing_event_is_left_for_a_retry(self):
+        event = OutboxEvent.objects.create(topic='payment.completed', payload={'payment_id': 12345})
+        with self.assertLogs('videoSharing.payments', 'ERROR'):
+            self.assertEqual(relay_outbox(10), 0)
+        event.refresh_from_db()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertTrue(event.last_error)
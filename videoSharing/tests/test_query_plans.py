@@ -0,0 +1,20 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from videoSharing.management.commands.check_query_plans import HOT_QUERIES
+
+
+class HotQueryPlanTests(TestCase):
+    def test_hot_queries_use_their_index(self):
+        for description, queryset, index_names in HOT_QUERIES:
+            with self.subTest(description):
+                plan = queryset().explain().lower()
+                self.assertTrue(any(name.lower() in plan for name in index_names),
+                                f'{description} does not use {index_names[0]}:\n{plan}')
+
+    def test_check_query_plans_command(self):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('All hot queries use their index.', out.getvalue())
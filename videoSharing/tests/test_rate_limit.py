@@ -0,0 +1,79 @@
+import json
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from videoSharing.models import User
+from videoSharing.rate_limit import MemoryRateLimiter, TokenBucket
+from videoSharing.routing import websocket_urlpatterns
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_allows_a_burst_then_refills_at_the_rate(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0)
+        self.assertEqual([bucket.take(now=0) for _ in range(4)], [True, True, True, False])
+        self.assertFalse(bucket.take(now=0.25))
+        self.assertTrue(bucket.take(now=0.5))
+        self.assertFalse(bucket.take(now=0.5))
+
+    def test_never_holds_more_than_the_burst(self):
+        bucket = TokenBucket(rate=10, burst=2, now=0)
+        self.assertEqual([bucket.take(now=100) for _ in range(3)], [True, True, False])
+        self.assertEqual(bucket.full_at(), 100 + 2 / 10)
+
+
+class MemoryRateLimiterTests(SimpleTestCase):
+    def test_keys_have_separate_buckets(self):
+        limiter = MemoryRateLimiter()
+        self.assertEqual([limiter.allow('user:1', 1, 2) for _ in range(3)], [True, True, False])
+        self.assertTrue(limiter.allow('user:2', 1, 2))
+
+    def test_full_buckets_are_pruned(self):
+        limiter = MemoryRateLimiter()
+        limiter.PRUNE_EVERY = 2
+        limiter.allow('user:1', 1000, 1)
+        limiter._buckets['user:1'].updated -= 1
+        limiter.allow('user:2', 1, 1)
+        self.assertEqual(list(limiter._buckets), ['user:2'])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class InboundRateLimitTests(SimpleTestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/comments/1/')
+        communicator.scope['user'] = User(pk=1, username='user')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def send_empty_comment(self, communicator):
+        await communicator.send_to(json.dumps({'content': ''}))
+
+    @override_settings(WEBSOCKET_RATE_LIMIT={**settings.WEBSOCKET_RATE_LIMIT, 'CONNECTION': (1, 2), 'USER': None,
+                                             'ON_LIMIT': 'drop', 'CLOSE_AFTER_DROPS': 3})
+    async def test_drop_warns_once_then_closes(self):
+        communicator = await self.connect()
+        for _ in range(2):
+            await self.send_empty_comment(communicator)
+            self.assertEqual(json.loads(await communicator.receive_from())['error'], 'Comment cannot be empty')
+
+        await self.send_empty_comment(communicator)
+        self.assertEqual(json.loads(await communicator.receive_from())['reason'], 'connection_rate')
+        await self.send_empty_comment(communicator)
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await self.send_empty_comment(communicator)
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': 4029})
+
+    @override_settings(WEBSOCKET_RATE_LIMIT={**settings.WEBSOCKET_RATE_LIMIT, 'CONNECTION': None, 'USER': (1, 1),
+                                             'ON_LIMIT': 'close'})
+    async def test_user_limit_is_shared_between_connections(self):
+        first = await self.connect()
+        second = await self.connect()
+        await self.send_empty_comment(first)
+        self.assertIn('error', json.loads(await first.receive_from()))
+
+        await self.send_empty_comment(second)
+        self.assertEqual(await second.receive_output(), {'type': 'websocket.close', 'code': 4029})
+        await first.disconnect()
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from videoSharing.models import Rating, User, Video
+from videoSharing.ratings import rate_video
+
+
+class RatingTotalsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'alice', 'password')
+        self.bob = User.objects.create_user('bob@example.com', 'bob', 'password')
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1')
+
+    def totals(self):
+        self.video.refresh_from_db()
+        return self.video.rating_sum, self.video.rating_count, self.video.average_rating
+
+    def test_rate_and_rerate(self):
+        self.assertEqual(rate_video(self.alice.pk, self.video.pk, 4), Decimal('4.00'))
+        self.assertEqual(rate_video(self.bob.pk, self.video.pk, 2), Decimal('3.00'))
+        self.assertEqual(rate_video(self.alice.pk, self.video.pk, 5), Decimal('3.50'))
+        self.assertEqual(rate_video(self.alice.pk, self.video.pk, 5), Decimal('3.50'))
+        self.assertEqual(self.totals(), (Decimal('7.0'), 2, Decimal('3.50')))
+        self.assertEqual(Rating.objects.count(), 2)
+
+    def test_api_create_update_and_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post('/api/ratings/', {'user': self.alice.pk, 'video': self.video.pk, 'score': '4.0'})
+        self.assertEqual(response.status_code, 201)
+        rate_video(self.bob.pk, self.video.pk, 2)
+        rating = Rating.objects.get(user=self.alice)
+
+        response = client.patch(f'/api/ratings/{rating.pk}/', {'score': '3.0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), (Decimal('5.0'), 2, Decimal('2.50')))
+
+        self.assertEqual(client.delete(f'/api/ratings/{rating.pk}/').status_code, 204)
+        self.assertEqual(self.totals(), (Decimal('2.0'), 1, Decimal('2.00')))
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from videoSharing.models import Comment, User, Video
+from videoSharing.response_cache import catalog_version, get_or_build, video_detail_key
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('viewer@example.com', 'viewer', 'password')
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1',
+                                          is_premium=False)
+
+    def test_get_or_build_builds_once(self):
+        calls = []
+        build = lambda: calls.append(1) or {'built': len(calls)}
+        self.assertEqual(get_or_build('key', build), {'built': 1})
+        self.assertEqual(get_or_build('key', build), {'built': 1})
+        self.assertEqual(len(calls), 1)
+
+    def test_saving_a_video_invalidates_its_detail_and_the_catalog(self):
+        key, catalog = video_detail_key(self.video.pk), catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.title = 'Renamed'
+            self.video.save()
+        self.assertNotEqual(video_detail_key(self.video.pk), key)
+        self.assertNotEqual(catalog_version(), catalog)
+
+    def test_a_comment_invalidates_the_video_but_not_the_catalog(self):
+        key, catalog = video_detail_key(self.video.pk), catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, video=self.video, content='Nice')
+        self.assertNotEqual(video_detail_key(self.video.pk), key)
+        self.assertEqual(catalog_version(), catalog)
+
+    def test_detail_is_served_from_cache_until_the_video_changes(self):
+        client = APIClient()
+        url = f'/api/video/{self.video.pk}/'
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url).data, first.data)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.filter(pk=self.video.pk).update(title='Renamed')
+            Video.objects.get(pk=self.video.pk).save()
+        changed = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['title'], 'Renamed')
@@ -0,0 +1,70 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from videoSharing.models import User, UserDailyStats, Video, VideoDailyStats, WatchHistory
+from videoSharing.rollups import delete_expired_watch_history
+from videoSharing.watch_events import write_watch_events
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer@example.com', 'viewer', 'password')
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1')
+        self.noon = timezone.make_aware(datetime.datetime(2026, 10, 10, 12))
+
+    def video_stats(self):
+        return set(VideoDailyStats.objects.values_list('video_id', 'day', 'watches', 'viewers'))
+
+    def test_repeat_watches_count_one_viewer_per_day(self):
+        day = self.noon.date()
+        write_watch_events([(self.user.pk, self.video.pk, self.noon),
+                            (self.user.pk, self.video.pk, self.noon + datetime.timedelta(hours=1))])
+        write_watch_events([(self.user.pk, self.video.pk, self.noon + datetime.timedelta(hours=2))])
+        self.assertEqual(self.video_stats(), {(self.video.pk, day, 3, 1)})
+        self.assertEqual(set(UserDailyStats.objects.values_list('user_id', 'day', 'watches', 'videos')),
+                         {(self.user.pk, day, 3, 1)})
+
+    def test_a_new_day_counts_the_viewer_again(self):
+        tomorrow = self.noon + datetime.timedelta(days=1)
+        write_watch_events([(self.user.pk, self.video.pk, self.noon)])
+        write_watch_events([(self.user.pk, self.video.pk, tomorrow)])
+        self.assertEqual(self.video_stats(), {(self.video.pk, self.noon.date(), 1, 1),
+                                              (self.video.pk, tomorrow.date(), 1, 1)})
+
+
+class WatchHistoryExpiryTests(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1')
+        now = timezone.now()
+        self.recent = []
+        for number in range(5):
+            user = User.objects.create_user(f'viewer{number}@example.com', f'viewer{number}', 'password')
+            days = 100 if number < 3 else 1
+            row = WatchHistory.objects.create(user=user, video=self.video,
+                                              watch_date=now - datetime.timedelta(days=days))
+            if days == 1:
+                self.recent.append(row.pk)
+
+    def test_old_rows_are_deleted_in_batches(self):
+        batches = []
+        cutoff = timezone.now() - datetime.timedelta(days=30)
+        self.assertEqual(delete_expired_watch_history(cutoff, batch_size=2, progress=batches.append), 3)
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(sorted(WatchHistory.objects.values_list('pk', flat=True)), self.recent)
+
+    def test_command_archives_the_deleted_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.ndjson')
+            call_command('compact_watch_history', retention_days=30, pause=0, archive=path, stdout=io.StringIO())
+            with open(path) as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['video'] for row in rows}, {self.video.pk})
+        self.assertEqual(sorted(WatchHistory.objects.values_list('pk', flat=True)), self.recent)
@@ -0,0 +1,40 @@
+import itertools
+
+from django.test import TestCase
+
+from videoSharing.models import Video
+from videoSharing.search import search_videos
+
+
+class SearchVideosTests(TestCase):
+    def setUp(self):
+        self.numbers = itertools.count(1)
+
+    def video(self, title, description):
+        url = f'https://example.com/{next(self.numbers)}'
+        return Video.objects.create(title=title, description=description, url=url)
+
+    def ids(self, query, limit=10):
+        return [video.pk for video in search_videos(query, limit)]
+
+    def test_title_matches_rank_above_description_matches(self):
+        in_description = self.video('Evening walk', 'Watching the guitar players downtown')
+        in_title = self.video('Guitar lesson', 'Chords for beginners')
+        self.assertEqual(self.ids('guitar'), [in_title.pk, in_description.pk])
+
+    def test_terms_match_as_prefixes_and_all_must_match(self):
+        both = self.video('Guitar lesson', 'Chords for beginners')
+        self.video('Guitar solo', 'Live on stage')
+        self.assertEqual(self.ids('gui begin'), [both.pk])
+        self.assertEqual(self.ids('  '), [])
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        video = self.video('Cooking pasta', 'A quick dinner')
+        self.assertEqual(self.ids('pasta'), [video.pk])
+
+        Video.objects.filter(pk=video.pk).update(title='Cooking rice')
+        self.assertEqual(self.ids('pasta'), [])
+        self.assertEqual(self.ids('rice'), [video.pk])
+
+        video.delete()
+        self.assertEqual(self.ids('rice'), [])
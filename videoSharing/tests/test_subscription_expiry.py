@@ -0,0 +1,36 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from videoSharing.entitlements import expire_subscriptions
+from videoSharing.models import Subscription, User
+
+
+class ExpireSubscriptionsTests(TestCase):
+    def subscribe(self, number, kind, days_left):
+        user = User.objects.create_user(f'user{number}@example.com', f'user{number}', 'password')
+        return Subscription.objects.create(user=user, subscription_type=kind, is_active=True,
+                                           end_date=timezone.now() + datetime.timedelta(days=days_left))
+
+    def test_ended_subscriptions_are_deactivated_in_batches(self):
+        ended = [self.subscribe(1, 'premium', -2), self.subscribe(2, 'free', -1), self.subscribe(3, 'premium', -1)]
+        current = self.subscribe(4, 'premium', 5)
+        batches = []
+
+        with mock.patch('videoSharing.entitlements.invalidate_entitlements') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            expired = expire_subscriptions(batch_size=2, progress=lambda counts: batches.append(counts.total()))
+
+        self.assertEqual(expired, {'premium': 2, 'free': 1})
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(set(Subscription.objects.filter(is_active=True)), {current})
+        self.assertEqual(sorted(user_id for call in invalidate.call_args_list for user_id in call.args[0]),
+                         sorted([ended[0].user_id, ended[2].user_id]))
+
+    def test_nothing_to_expire(self):
+        self.subscribe(1, 'premium', 5)
+        with mock.patch('videoSharing.entitlements.invalidate_entitlements') as invalidate:
+            self.assertEqual(expire_subscriptions(), {})
+        invalidate.assert_not_called()
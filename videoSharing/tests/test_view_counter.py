@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from videoSharing.models import Video, VideoViewBucket
+from videoSharing.response_cache import video_detail_key
+from videoSharing.view_counter import MemoryViewCounter
+
+
+class MemoryViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.counter = MemoryViewCounter()
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1',
+                                          view_count=10)
+
+    def test_views_are_buffered_until_flush(self):
+        self.assertEqual(self.counter.increment(self.video.pk), 11)
+        self.assertEqual(self.counter.increment(self.video.pk), 12)
+        self.assertEqual(self.counter.get(self.video.pk), 12)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 10)
+
+        self.assertEqual(self.counter.flush(), {self.video.pk: 2})
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 12)
+        self.assertEqual(self.counter.flush(), {})
+
+    def test_flush_writes_one_update_per_distinct_amount(self):
+        other = Video.objects.create(title='Other', description='Another video', url='https://example.com/2')
+        for video_id in (self.video.pk, other.pk, self.video.pk, other.pk):
+            self.counter.increment(video_id)
+
+        with mock.patch('videoSharing.view_counter.record_view_series'), \
+                mock.patch('videoSharing.view_counter.record_trending_views'), \
+                CaptureQueriesContext(connection) as queries:
+            self.counter.flush()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(set(Video.objects.values_list('view_count', flat=True)), {12, 2})
+
+    def test_flush_fills_the_view_buckets(self):
+        self.counter.increment(self.video.pk)
+        self.counter.increment(self.video.pk)
+        self.counter.flush()
+        self.assertEqual(
+            dict(VideoViewBucket.objects.filter(video=self.video).values_list('granularity', 'views')),
+            {'trending': 2, 'hour': 2, 'day': 2},
+        )
+
+    def test_flush_invalidates_the_cached_detail(self):
+        key = video_detail_key(self.video.pk)
+        self.counter.increment(self.video.pk)
+        self.counter.flush()
+        self.assertNotEqual(video_detail_key(self.video.pk), key)
+
+    def test_failed_flush_keeps_the_views(self):
+        self.counter.increment(self.video.pk)
+        with mock.patch('videoSharing.view_counter.apply_view_counts', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.counter.flush()
+        self.assertEqual(self.counter.get(self.video.pk), 11)
+
+        self.counter.flush()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 11)
+
+    def test_cache_failure_after_commit_does_not_count_the_views_twice(self):
+        self.counter.increment(self.video.pk)
+        with mock.patch('videoSharing.view_counter.invalidate_videos', side_effect=ConnectionError), \
+                self.assertLogs('videoSharing.view_counter', 'ERROR'):
+            self.counter.flush()
+        self.assertEqual(self.counter.flush(), {})
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 11)
+
+    def test_views_of_deleted_videos_are_dropped(self):
+        self.counter.increment(self.video.pk)
+        self.video.delete()
+        self.counter.flush()
+        self.assertFalse(Video.objects.exists())
+        self.assertFalse(VideoViewBucket.objects.exists())
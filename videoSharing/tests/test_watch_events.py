@@ -0,0 +1,95 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from videoSharing.metrics import watch_events_dropped
+from videoSharing.models import User, Video, WatchHistory
+from videoSharing.watch_events import WatchHistoryPipeline, WatchQueueFull, write_watch_events
+
+
+class WatchEventMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('viewer@example.com', 'viewer', 'password')
+        self.video = Video.objects.create(title='Video', description='A video', url='https://example.com/1')
+        self.other = Video.objects.create(title='Other', description='Another video', url='https://example.com/2')
+        self.now = timezone.now().replace(microsecond=0)
+
+    def history(self):
+        return set(WatchHistory.objects.values_list('user_id', 'video_id', 'watch_date'))
+
+
+class WriteWatchEventsTests(WatchEventMixin, TestCase):
+    def test_keeps_the_queued_time_of_the_latest_event_per_pair(self):
+        earlier = self.now - datetime.timedelta(hours=1)
+        written = write_watch_events([
+            (self.user.pk, self.video.pk, self.now),
+            (self.user.pk, self.video.pk, earlier),
+            (self.user.pk, self.other.pk, earlier),
+        ])
+        self.assertEqual(written, 2)
+        self.assertEqual(self.history(), {(self.user.pk, self.video.pk, self.now),
+                                          (self.user.pk, self.other.pk, earlier)})
+
+    def test_upserts_an_existing_pair(self):
+        write_watch_events([(self.user.pk, self.video.pk, self.now - datetime.timedelta(days=1))])
+        write_watch_events([(self.user.pk, self.video.pk, self.now)])
+        self.assertEqual(self.history(), {(self.user.pk, self.video.pk, self.now)})
+
+
+class DeletedRowTests(WatchEventMixin, TransactionTestCase):
+    # Foreign keys are only checked at commit, so this needs real transactions.
+    def test_events_of_deleted_videos_do_not_block_the_batch(self):
+        deleted = Video.objects.create(title='Gone', description='Deleted video', url='https://example.com/3')
+        deleted_id = deleted.pk
+        deleted.delete()
+        written = write_watch_events([(self.user.pk, deleted_id, self.now), (self.user.pk, self.video.pk, self.now)])
+        self.assertEqual(written, 1)
+        self.assertEqual(self.history(), {(self.user.pk, self.video.pk, self.now)})
+
+
+class WatchHistoryPipelineTests(WatchEventMixin, TestCase):
+    def pipeline(self, **config):
+        pipeline = WatchHistoryPipeline({'BATCH_SIZE': 2, 'MAX_QUEUE_SIZE': 0, 'FLUSH_ON_EXIT': False, **config})
+        patcher = mock.patch.object(pipeline.flusher, 'ensure_started')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pipeline
+
+    def test_events_wait_for_the_flush(self):
+        pipeline = self.pipeline()
+        pipeline.record(self.user.pk, self.video.pk, self.now)
+        pipeline.record(self.user.pk, self.other.pk, self.now)
+        pipeline.record(self.user.pk, self.video.pk, self.now + datetime.timedelta(minutes=1))
+        self.assertFalse(WatchHistory.objects.exists())
+
+        self.assertEqual(pipeline.flush(), 3)
+        self.assertEqual(len(pipeline.queue), 0)
+        self.assertEqual(self.history(), {(self.user.pk, self.video.pk, self.now + datetime.timedelta(minutes=1)),
+                                          (self.user.pk, self.other.pk, self.now)})
+
+    def test_failed_batch_goes_back_to_the_queue(self):
+        pipeline = self.pipeline()
+        pipeline.record(self.user.pk, self.video.pk, self.now)
+        with mock.patch('videoSharing.watch_events.write_watch_events', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            pipeline.flush()
+        self.assertEqual(len(pipeline.queue), 1)
+        pipeline.flush()
+        self.assertEqual(self.history(), {(self.user.pk, self.video.pk, self.now)})
+
+    def test_full_queue_drops_or_raises(self):
+        dropping = self.pipeline(MAX_QUEUE_SIZE=1)
+        dropped = watch_events_dropped.labels().value
+        dropping.record(self.user.pk, self.video.pk, self.now)
+        with self.assertLogs('videoSharing.watch_events', 'WARNING'):
+            dropping.record(self.user.pk, self.other.pk, self.now)
+        self.assertEqual(len(dropping.queue), 1)
+        self.assertEqual(watch_events_dropped.labels().value, dropped + 1)
+        self.assertFalse(WatchHistory.objects.exists())
+
+        raising = self.pipeline(MAX_QUEUE_SIZE=1, OVERFLOW='raise')
+        raising.record(self.user.pk, self.video.pk, self.now)
+        with self.assertRaises(WatchQueueFull):
+            raising.record(self.user.pk, self.other.pk, self.now)
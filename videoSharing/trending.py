@@ -0,0 +1,155 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Video, VideoViewBucket
+from .rollups import bucket_start, from_epoch, increment_counters
+
+
+class DatabaseTrending:
+    """Per-video view counts in ``'trending'`` ``VideoViewBucket`` rows, one row per video and bucket.
+
+    A ranking sums the buckets inside the window, so its cost depends on the
+    number of videos viewed within the window rather than on the history;
+    buckets older than the longest window are deleted as new views arrive.
+    Rankings are cached for ``cache_timeout`` seconds.
+    """
+
+    CACHE_KEY = 'trending:{}:{}:{}'
+
+    def __init__(self, bucket_seconds, windows, cache_timeout=30):
+        self.bucket_seconds = bucket_seconds
+        self.windows = windows
+        self.cache_timeout = cache_timeout
+
+    def record(self, counts, now):
+        start = from_epoch(bucket_start(now, self.bucket_seconds))
+        with transaction.atomic():
+            # Views of videos deleted since they were buffered are dropped.
+            existing = Video.objects.filter(pk__in=counts).values_list('pk', flat=True)
+            increment_counters(VideoViewBucket, ('video_id', 'granularity', 'bucket_start'),
+                               {(video_id, 'trending', start): {'views': counts[video_id]} for video_id in existing})
+        VideoViewBucket.objects.filter(
+            granularity='trending', bucket_start__lt=self._oldest_start(max(self.windows.values()), now),
+        ).delete()
+
+    def _oldest_start(self, window_seconds, now):
+        return from_epoch(bucket_start(now, self.bucket_seconds) - window_seconds + self.bucket_seconds)
+
+    def top(self, window, limit, now):
+        oldest = self._oldest_start(self.windows[window], now)
+        key = self.CACHE_KEY.format(window, limit, int(oldest.timestamp()))
+        ranking = cache.get(key)
+        if ranking is None:
+            rows = (VideoViewBucket.objects.filter(granularity='trending', bucket_start__gte=oldest)
+                    .values('video').annotate(total=Sum('views')).order_by('-total', 'video')[:limit])
+            ranking = [(row['video'], row['total']) for row in rows]
+            cache.set(key, ranking, self.cache_timeout)
+        return ranking
+
+
+class RedisTrending:
+    """Sliding-window rankings kept incrementally in Redis sorted sets.
+
+    Views are added to the sorted set of the current bucket and to one
+    running sorted set per window. When a bucket slides out of a window its
+    counts are subtracted from that window's set, so reading a ranking is a
+    single ZREVRANGE however much history there is.
+    """
+
+    BUCKET_KEY = 'trending:bucket:{}'
+    WINDOW_KEY = 'trending:window:{}'
+    HORIZON_KEY = 'trending:window:{}:horizon'
+    EXPIRE_LOCK_KEY = 'trending:expire:lock'
+
+    def __init__(self, bucket_seconds, windows, alias='default'):
+        self.bucket_seconds = bucket_seconds
+        self.windows = windows
+        self.alias = alias
+
+    @property
+    def redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def record(self, counts, now):
+        conn = self.redis
+        start = bucket_start(now, self.bucket_seconds)
+        self._expire(conn, now)
+
+        bucket_key = self.BUCKET_KEY.format(start)
+        pipe = conn.pipeline()
+        for video_id, amount in counts.items():
+            pipe.zincrby(bucket_key, amount, video_id)
+            for window in self.windows:
+                pipe.zincrby(self.WINDOW_KEY.format(window), amount, video_id)
+        pipe.expire(bucket_key, max(self.windows.values()) + self.bucket_seconds)
+        pipe.execute()
+
+    def _expire(self, conn, now):
+        """Subtract every bucket that has slid out of a window since the last call."""
+        lock = conn.lock(self.EXPIRE_LOCK_KEY, timeout=30, blocking=False)
+        if not lock.acquire():
+            return
+        try:
+            current = bucket_start(now, self.bucket_seconds)
+            for window, seconds in self.windows.items():
+                horizon_key = self.HORIZON_KEY.format(window)
+                horizon = current - seconds + self.bucket_seconds
+                previous = conn.get(horizon_key)
+                if previous is None:
+                    conn.set(horizon_key, horizon)
+                    continue
+                previous = int(previous)
+                if previous >= horizon:
+                    continue
+
+                window_key = self.WINDOW_KEY.format(window)
+                pipe = conn.pipeline()
+                if horizon - previous >= seconds:
+                    pipe.delete(window_key)
+                else:
+                    for expired in range(previous, horizon, self.bucket_seconds):
+                        pipe.zunionstore(window_key, {window_key: 1, self.BUCKET_KEY.format(expired): -1})
+                    pipe.zremrangebyscore(window_key, '-inf', 0)
+                pipe.set(horizon_key, horizon)
+                pipe.execute()
+        finally:
+            lock.release()
+
+    def top(self, window, limit, now):
+        conn = self.redis
+        self._expire(conn, now)
+        return [(int(video_id), int(views))
+                for video_id, views in conn.zrevrange(self.WINDOW_KEY.format(window), 0, limit - 1, withscores=True)]
+
+
+_BACKENDS = {
+    'database': DatabaseTrending,
+    'redis': RedisTrending,
+}
+
+
+def _build_trending():
+    config = settings.TRENDING
+    return _BACKENDS[config.get('BACKEND', 'database')](
+        config['BUCKET_SECONDS'], config['WINDOWS'], **config.get('OPTIONS', {})
+    )
+
+
+trending = _build_trending()
+
+
+def record_trending_views(counts, now=None):
+    """Add ``{video_id: views}`` to the current bucket of every window."""
+    counts = {int(video_id): amount for video_id, amount in counts.items() if amount}
+    if counts:
+        trending.record(counts, time.time() if now is None else now)
+
+
+def trending_videos(window, limit, now=None):
+    """Return ``[(video_id, views), ...]`` for the ``limit`` most viewed videos in ``window``."""
+    return trending.top(window, limit, time.time() if now is None else now)
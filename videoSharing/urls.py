@@ -4,9 +4,11 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from .async_views import AsyncVideoListView, AsyncVideoDetailView, AsyncCheckSubscriptionStatusView, \
+    AsyncPaymentHistoryView, ExportView
 from .views import VideoViewSet, SubscriptionViewSet, WatchHistoryViewSet, RenewSubscriptionView, \
     CancelSubscriptionView, CheckSubscriptionStatusView, UserRegistrationView, PaymentView, PaymentHistoryView, \
-    CommentViewSet, RatingViewSet
+    CommentViewSet, RatingViewSet, PaymentDetailView
 
 router = DefaultRouter()
 router.register(r'video', VideoViewSet)
@@ -22,7 +24,13 @@ urlpatterns = [
     path('subscriptions/check/', CheckSubscriptionStatusView.as_view(), name='check-subscription'),
     path('register/', UserRegistrationView.as_view(), name='user-register'),
     path('payment/', PaymentView.as_view(), name='payment'),
+    path('payment/<int:pk>/', PaymentDetailView.as_view(), name='payment-detail'),
     path('payment/history/', PaymentHistoryView.as_view(), name='payment-history'),
+    path('async/video/', AsyncVideoListView.as_view(), name='async-video-list'),
+    path('async/video/<int:pk>/', AsyncVideoDetailView.as_view(), name='async-video-detail'),
+    path('async/subscriptions/check/', AsyncCheckSubscriptionStatusView.as_view(), name='async-check-subscription'),
+    path('async/payment/history/', AsyncPaymentHistoryView.as_view(), name='async-payment-history'),
+    path('export/<str:dataset>/', ExportView.as_view(), name='export'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
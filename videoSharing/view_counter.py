@@ -0,0 +1,194 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .analytics import record_view_series
+from .background import PeriodicTask
+from .models import Video
+from .response_cache import invalidate_videos
+from .rollups import increment_counters
+from .trending import record_trending_views
+
+logger = logging.getLogger(__name__)
+
+
+def _load_view_count(video_id):
+    return Video.objects.values_list('view_count', flat=True).get(pk=video_id)
+
+
+def apply_view_counts(counts):
+    """Persist ``{video_id: views}`` with one UPDATE per distinct increment.
+
+    The views are added to the per-video analytics buckets in the same
+    transaction.
+    """
+    with transaction.atomic():
+        increments = {(video_id,): {'view_count': amount} for video_id, amount in counts.items()}
+        increment_counters(Video, ('pk',), increments, create=False)
+        record_view_series(counts)
+
+    # The totals are committed, so a failure below must not put the views
+    # back in the buffer, where they would be counted twice.
+    try:
+        invalidate_videos(counts)
+    except Exception:
+        logger.exception('Could not invalidate cached responses of %d videos', len(counts))
+    try:
+        record_trending_views(counts)
+    except Exception:
+        logger.exception('Could not record %d videos in trending rankings', len(counts))
+
+
+class MemoryViewCounter:
+    """Per-process write-behind counter.
+
+    Live totals are the persisted count loaded once per video plus the views
+    buffered since the last flush. Videos that received no views during a
+    flush interval are evicted so their total is re-read on the next view.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._persisted = {}
+
+    def increment(self, video_id, amount=1):
+        video_id = int(video_id)
+        with self._lock:
+            loaded = video_id in self._persisted
+            if loaded:
+                self._pending[video_id] += amount
+                return self._persisted[video_id] + self._pending[video_id]
+
+        base = _load_view_count(video_id)
+        with self._lock:
+            self._persisted.setdefault(video_id, base)
+            self._pending[video_id] += amount
+            return self._persisted[video_id] + self._pending[video_id]
+
+    def get(self, video_id):
+        video_id = int(video_id)
+        with self._lock:
+            if video_id in self._persisted:
+                return self._persisted[video_id] + self._pending.get(video_id, 0)
+        return _load_view_count(video_id)
+
+    def flush(self):
+        with self._lock:
+            batch = {video_id: n for video_id, n in self._pending.items() if n}
+            self._pending = defaultdict(int)
+            for video_id in list(self._persisted):
+                if video_id in batch:
+                    self._persisted[video_id] += batch[video_id]
+                else:
+                    del self._persisted[video_id]
+
+        if not batch:
+            return batch
+        try:
+            apply_view_counts(batch)
+        except Exception:
+            with self._lock:
+                for video_id, n in batch.items():
+                    self._pending[video_id] += n
+                    if video_id in self._persisted:
+                        self._persisted[video_id] -= n
+            raise
+        return batch
+
+
+class RedisViewCounter:
+    """Write-behind counter shared by every worker through Redis.
+
+    ``view_counter:total:<id>`` holds the live total (seeded from the database
+    and kept for ``TOTAL_TTL`` seconds) and the ``view_counter:pending`` hash
+    holds views not yet written back. A flush atomically renames the pending
+    hash so concurrent increments land in a fresh one.
+    """
+
+    PENDING_KEY = 'view_counter:pending'
+    TOTAL_KEY = 'view_counter:total:{}'
+
+    def __init__(self, alias='default', total_ttl=24 * 60 * 60):
+        self.alias = alias
+        self.total_ttl = total_ttl
+
+    @property
+    def redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def _ensure_total(self, conn, video_id):
+        key = self.TOTAL_KEY.format(video_id)
+        if not conn.exists(key):
+            conn.set(key, _load_view_count(video_id), nx=True, ex=self.total_ttl)
+        return key
+
+    def increment(self, video_id, amount=1):
+        video_id = int(video_id)
+        conn = self.redis
+        key = self._ensure_total(conn, video_id)
+        pipe = conn.pipeline()
+        pipe.hincrby(self.PENDING_KEY, video_id, amount)
+        pipe.incrby(key, amount)
+        return int(pipe.execute()[1])
+
+    def get(self, video_id):
+        video_id = int(video_id)
+        conn = self.redis
+        return int(conn.get(self._ensure_total(conn, video_id)))
+
+    def flush(self):
+        from redis.exceptions import ResponseError
+
+        conn = self.redis
+        flushing_key = f'{self.PENDING_KEY}:flushing:{uuid.uuid4().hex}'
+        try:
+            conn.rename(self.PENDING_KEY, flushing_key)
+        except ResponseError:
+            # Nothing has been buffered since the last flush.
+            return {}
+
+        batch = {int(k): int(v) for k, v in conn.hgetall(flushing_key).items()}
+        try:
+            apply_view_counts(batch)
+        except Exception:
+            pipe = conn.pipeline()
+            for video_id, n in batch.items():
+                pipe.hincrby(self.PENDING_KEY, video_id, n)
+            pipe.execute()
+            raise
+        finally:
+            conn.delete(flushing_key)
+        return batch
+
+
+_BACKENDS = {
+    'memory': MemoryViewCounter,
+    'redis': RedisViewCounter,
+}
+
+
+def _build_counter():
+    config = settings.VIEW_COUNTER
+    return _BACKENDS[config.get('BACKEND', 'memory')](**config.get('OPTIONS', {}))
+
+
+view_counter = _build_counter()
+
+
+def flush_view_counts():
+    return view_counter.flush()
+
+
+flusher = PeriodicTask(flush_view_counts, settings.VIEW_COUNTER.get('FLUSH_INTERVAL', 5), name='view-counter-flush')
+
+
+def record_view(video_id):
+    """Buffer one view of ``video_id`` and return its live view count."""
+    flusher.ensure_started()
+    return view_counter.increment(video_id)
@@ -1,20 +1,40 @@
 import datetime
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import reverse
 from django.utils import timezone
+from django.views import View
 
-
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 
-from .payment_processor import PaymentProcessor
+from .broadcast import publish_in_background
+from . import metrics
+from .analytics import GRANULARITIES, bucket_count, view_series
+from .conditional import conditional, comment_list_etag, comment_list_last_modified, video_detail_etag, \
+    video_detail_last_modified, video_list_etag, video_list_last_modified
+from .exports import parse_moment
+from .pagination import CommentCursorPagination, PaymentCursorPagination, VideoCursorPagination, \
+    VideoSearchPagination, WatchHistoryCursorPagination
+from .payments import IdempotencyConflict, enqueue_payment
+from .ratings import apply_rating_delta
+from .related import related_videos
+from .search import search_videos
+from .response_cache import get_or_build, video_detail_key, video_list_key
+from .trending import trending_videos
 from .models import Video, Subscription, WatchHistory, Payment, Comment, Rating, User
-from .serializers import VideoSerializer, SubscriptionSerializer, WatchHistorySerializer, RegisterSerializer, \
-    PaymentSerializer, CommentSerializer, RatingSerializer
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from .watch_events import record_watch
+from .serializers import VideoSerializer, VideoDetailSerializer, SubscriptionSerializer, WatchHistorySerializer, \
+    RegisterSerializer, PaymentSerializer, CommentSerializer, RatingSerializer, TrendingVideoSerializer, \
+    RelatedVideoSerializer, PaymentRequestSerializer
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 
 
 class UserRegistrationView(APIView):
@@ -30,23 +50,152 @@ class UserRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def count_per_video(model):
+    counts = model.objects.filter(video=OuterRef('pk')).order_by().values('video').annotate(count=Count('pk'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
 class VideoViewSet(viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
     permission_classes = [AllowAny]
+    pagination_class = VideoCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            preview_size = settings.VIDEO_DETAIL_PREVIEW_SIZE
+            queryset = queryset.annotate(
+                comment_count=count_per_video(Comment),
+            ).prefetch_related(
+                Prefetch('comment_set', Comment.objects.order_by('-created_at', '-id')[:preview_size],
+                         to_attr='latest_comments'),
+            )
+        return queryset
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return VideoDetailSerializer
+        return super().get_serializer_class()
 
-        if request.user.is_authenticated:
-            WatchHistory.objects.update_or_create(
-                user=request.user,
-                video=instance,
-                defaults={'watch_date': timezone.now()}
-            )
+    @conditional(video_list_etag, video_list_last_modified)
+    def list(self, request, *args, **kwargs):
+        build_list = super().list
+        data = get_or_build(video_list_key(request.META.get('QUERY_STRING', '')),
+                            lambda: build_list(request, *args, **kwargs).data)
+        return Response(data)
 
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+    def retrieve(self, request, *args, **kwargs):
+        # Recorded outside the conditional GET, so a client revalidating its
+        # copy with a 304 still counts as a watch.
+        response = self._retrieve_detail(request, *args, **kwargs)
+        if request.user.is_authenticated and response.status_code in (200, 304):
+            record_watch(request.user.pk, kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return response
+
+    @conditional(video_detail_etag, video_detail_last_modified)
+    def _retrieve_detail(self, request, *args, **kwargs):
+        video_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return Response(get_or_build(video_detail_key(video_id), lambda: self.get_serializer(self.get_object()).data))
+
+    @action(detail=True)
+    def comments(self, request, pk=None):
+        return self._paginated_children(Comment.objects.filter(video_id=pk), CommentSerializer,
+                                        CommentCursorPagination())
+
+    @action(detail=True)
+    def history(self, request, pk=None):
+        return self._paginated_children(WatchHistory.objects.filter(video_id=pk), WatchHistorySerializer,
+                                        WatchHistoryCursorPagination())
+
+    @action(detail=False)
+    def trending(self, request):
+        config = settings.TRENDING
+        window = request.query_params.get('window', config['DEFAULT_WINDOW'])
+        if window not in config['WINDOWS']:
+            return Response({'detail': f'window must be one of: {", ".join(config["WINDOWS"])}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', config['DEFAULT_LIMIT']))
+        except ValueError:
+            limit = config['DEFAULT_LIMIT']
+        limit = max(1, min(limit, config['MAX_LIMIT']))
+
+        ranking = trending_videos(window, limit)
+        videos = Video.objects.in_bulk([video_id for video_id, _ in ranking])
+        results = []
+        for video_id, views in ranking:
+            video = videos.get(video_id)
+            if video is not None:
+                video.trending_views = views
+                results.append(video)
+        return Response({'window': window, 'results': TrendingVideoSerializer(results, many=True).data})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def batch(self, request):
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of videos.'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = VideoSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'Provide a search query with ?q=.'}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = VideoSearchPagination()
+        videos = paginator.paginate(request, lambda limit, offset: search_videos(query, limit, offset))
+        return paginator.get_paginated_response(VideoSerializer(videos, many=True).data)
+
+    @action(detail=True)
+    def analytics(self, request, pk=None):
+        config = settings.VIEW_ANALYTICS
+        granularity = request.query_params.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            return Response({'detail': f'granularity must be one of: {", ".join(GRANULARITIES)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = parse_moment(request.query_params.get('end')) or timezone.now()
+            start = parse_moment(request.query_params.get('start')) or end - config['DEFAULT_RANGE'][granularity]
+            points = request.query_params.get('points')
+            points = int(points) if points else None
+        except ValueError:
+            return Response({'detail': 'start and end must be ISO 8601 datetimes and points an integer.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start >= end or (points is not None and points < 1):
+            return Response({'detail': 'start must be before end and points positive.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if bucket_count(granularity, start, end) > config['MAX_BUCKETS']:
+            return Response({'detail': f'The range spans more than {config["MAX_BUCKETS"]} {granularity} buckets.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        self.get_object()
+        series = view_series(pk, granularity, start, end, points)
+        return Response({
+            'granularity': granularity,
+            'start': start,
+            'end': end,
+            'points': [{'start': moment, 'views': views} for moment, views in series],
+        })
+
+    @action(detail=True)
+    def related(self, request, pk=None):
+        config = settings.RELATED_VIDEOS
+        try:
+            limit = int(request.query_params.get('limit', config['DEFAULT_LIMIT']))
+        except ValueError:
+            limit = config['DEFAULT_LIMIT']
+        videos = related_videos(pk, max(1, min(limit, config['TOP_K'])))
+        if not videos:
+            self.get_object()
+        return Response({'results': RelatedVideoSerializer(videos, many=True).data})
+
+    def _paginated_children(self, queryset, serializer_class, paginator):
+        self.get_object()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        return paginator.get_paginated_response(serializer_class(page, many=True).data)
 
 
 class SubscriptionViewSet(viewsets.ModelViewSet):
@@ -59,35 +208,38 @@ class WatchHistoryViewSet(viewsets.ModelViewSet):
     queryset = WatchHistory.objects.all()
     serializer_class = WatchHistorySerializer
     permission_classes = [AllowAny]
+    pagination_class = WatchHistoryCursorPagination
+
+
+def enqueue_payment_response(request, purpose):
+    """Queue a payment for ``process_payments`` and answer 202 Accepted.
+
+    The idempotency key comes from the ``Idempotency-Key`` header or the
+    ``idempotency_key`` field. Repeating a request returns the payment it
+    created, with its current status, instead of charging again.
+    """
+    serializer = PaymentRequestSerializer(data={
+        'amount': request.data.get('amount'),
+        'idempotency_key': request.headers.get('Idempotency-Key') or request.data.get('idempotency_key'),
+    })
+    serializer.is_valid(raise_exception=True)
+    try:
+        payment, created = enqueue_payment(request.user.pk, purpose=purpose, **serializer.validated_data)
+    except IdempotencyConflict:
+        return Response({"detail": "This idempotency key was already used for a different payment."},
+                        status=status.HTTP_409_CONFLICT)
+    return Response(PaymentSerializer(payment).data,
+                    status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+                    headers={'Location': reverse('payment-detail', args=[payment.pk])})
 
 
 class RenewSubscriptionView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        subscription = Subscription.objects.filter(user=request.user, is_active=True).first()
-
-        if not subscription:
+        if not Subscription.objects.filter(user=request.user, is_active=True).exists():
             return Response({"detail": "No active subscription found."}, status=status.HTTP_404_NOT_FOUND)
-
-        amount = request.data.get('amount')
-
-        payment_processor = PaymentProcessor()
-        payment_successful = payment_processor.create_payment(request.user, amount)
-
-        if payment_successful:
-            payment = Payment.objects.create(
-                user=request.user,
-                amount=amount,
-                transaction_id='some_unique_id',
-                status='successful',
-                created_at=timezone.now()
-            )
-
-            subscription.renew_subscription()
-            return Response({"detail": "Subscription renewed successfully."}, status=status.HTTP_200_OK)
-
-        return Response({"detail": "Payment failed."}, status=status.HTTP_402_PAYMENT_REQUIRED)
+        return enqueue_payment_response(request, 'renewal')
 
 
 class CheckSubscriptionStatusView(APIView):
@@ -118,67 +270,94 @@ class PaymentView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        amount = request.data.get('amount')
-
-        payment_processor = PaymentProcessor()
-        payment_successful = payment_processor.create_payment(request.user, amount)
-
-        if payment_successful:
-            try:
-                payment = Payment.objects.create(
-                    user=request.user,
-                    amount=amount,
-                    transaction_id='some_unique_id',
-                    status='successful',
-                    created_at=timezone.now()
-                )
-
-                subscription = Subscription.objects.get(user=request.user)
+        if not Subscription.objects.filter(user=request.user).exists():
+            return Response({"detail": "No subscription found."}, status=status.HTTP_404_NOT_FOUND)
+        return enqueue_payment_response(request, 'upgrade')
 
-                if subscription.subscription_type == 'free':
-                    subscription.subscription_type = 'premium'
-                    subscription.start_date = timezone.now()
-                    subscription.end_date = timezone.now() + datetime.timedelta(days=30)
-                    subscription.is_active = True
-                    subscription.save()
-                    return Response({"detail": "Upgraded to premium successfully."}, status=status.HTTP_200_OK)
 
-                elif subscription.subscription_type == 'premium':
-                    subscription.renew_subscription()
-                    return Response({"detail": "Subscription renewed successfully."}, status=status.HTTP_200_OK)
-
-            except Subscription.DoesNotExist:
-                return Response({"detail": "No subscription found."}, status=status.HTTP_404_NOT_FOUND)
+class PaymentDetailView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        return Response({"detail": "Payment failed."}, status=status.HTTP_402_PAYMENT_REQUIRED)
+    def get(self, request, pk):
+        payment = Payment.objects.filter(pk=pk, user=request.user).first()
+        if payment is None:
+            return Response({"detail": "Payment not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(PaymentSerializer(payment).data)
 
 
 class PaymentHistoryView(APIView):
     def get(self, request):
         payments = Payment.objects.filter(user=request.user)
 
-        serializer = PaymentSerializer(payments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = PaymentCursorPagination()
+        page = paginator.paginate_queryset(payments, request, view=self)
+        serializer = PaymentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentCursorPagination
+
+    @conditional(comment_list_etag, comment_list_last_modified)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         comment = serializer.save()
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            'comments_comments',
+        transaction.on_commit(lambda: publish_in_background(
+            f'comments_{comment.video_id}',
             {
                 'type': 'comment_message',
-                'message': f'New comment by {comment.user.username} on {comment.video.title}'
+                'comment': {
+                    'user': comment.user.username,
+                    'video': comment.video_id,
+                    'content': comment.content,
+                    'created_at': comment.created_at.isoformat()
+                }
             }
-        )
+        ))
 
 
 class RatingViewSet(viewsets.ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        rating = serializer.save()
+        apply_rating_delta(rating.video_id, rating.score, 1)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Read the old values under a lock so concurrent edits each move
+        # the totals from what the other left behind.
+        old_video_id, old_score = (Rating.objects.select_for_update()
+                                   .values_list('video_id', 'score').get(pk=serializer.instance.pk))
+        rating = serializer.save()
+        if rating.video_id == old_video_id:
+            apply_rating_delta(rating.video_id, rating.score - old_score, 0)
+        else:
+            apply_rating_delta(old_video_id, -old_score, -1)
+            apply_rating_delta(rating.video_id, rating.score, 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Only the request that actually deletes the row takes its vote back.
+        current = (Rating.objects.select_for_update()
+                   .filter(pk=instance.pk).values_list('video_id', 'score').first())
+        if current is not None:
+            Rating.objects.filter(pk=instance.pk).delete()
+            apply_rating_delta(current[0], -current[1], -1)
+
+
+class MetricsView(View):
+    """Prometheus scrape endpoint for this worker's metrics."""
+
+    def get(self, request):
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS['ALLOWED_IPS']:
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .background import PeriodicTask
+from .metrics import watch_events_dropped
+from .models import User, UserDailyStats, Video, VideoDailyStats, WatchHistory
+from .related import record_co_watches
+from .rollups import daily_rollups, increment_counters, previous_watch_dates
+
+logger = logging.getLogger(__name__)
+
+
+class WatchQueueFull(Exception):
+    pass
+
+
+def _write_watch_events(events):
+    latest = {}
+    for user_id, video_id, watch_date in events:
+        key = (user_id, video_id)
+        if key not in latest or latest[key] < watch_date:
+            latest[key] = watch_date
+
+    previous = previous_watch_dates(latest)
+    WatchHistory.objects.upsert((user, video, watch_date) for (user, video), watch_date in latest.items())
+    video_days, user_days = daily_rollups(events, previous)
+    increment_counters(VideoDailyStats, ('video_id', 'day'), video_days)
+    increment_counters(UserDailyStats, ('user_id', 'day'), user_days)
+    return latest, [pair for pair in latest if pair not in previous]
+
+
+def write_watch_events(events):
+    """Bulk-upsert ``(user_id, video_id, watch_date)`` events, keeping the latest per pair.
+
+    Every event is also added to the daily video and user stats in the same
+    transaction, so the rollups never count a batch twice or miss one.
+    """
+    events = list(events)
+    try:
+        with transaction.atomic():
+            latest, new_pairs = _write_watch_events(events)
+    except IntegrityError:
+        # A user or video was deleted after the event was queued; drop its
+        # events instead of failing the whole batch forever.
+        user_ids = set(User.objects.filter(pk__in={event[0] for event in events}).values_list('pk', flat=True))
+        video_ids = set(Video.objects.filter(pk__in={event[1] for event in events}).values_list('pk', flat=True))
+        events = [event for event in events if event[0] in user_ids and event[1] in video_ids]
+        with transaction.atomic():
+            latest, new_pairs = _write_watch_events(events)
+
+    if new_pairs and settings.RELATED_VIDEOS['INCREMENTAL']:
+        # The watches are committed; a failure here only leaves the related
+        # videos to be caught up by the next build_related_videos run.
+        try:
+            record_co_watches(new_pairs)
+        except Exception:
+            logger.exception('Could not update related videos for %d new watches', len(new_pairs))
+    return len(latest)
+
+
+class MemoryWatchQueue:
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def push(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    def pop_batch(self, size):
+        with self._lock:
+            return [self._events.popleft() for _ in range(min(size, len(self._events)))]
+
+    def requeue(self, events):
+        with self._lock:
+            self._events.extendleft(reversed(events))
+
+
+class RedisWatchQueue:
+    """A Redis list shared by every worker, so any process can drain it."""
+
+    KEY = 'watch_events'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def __len__(self):
+        return self.redis.llen(self.KEY)
+
+    def push(self, event):
+        user_id, video_id, watch_date = event
+        self.redis.rpush(self.KEY, json.dumps([user_id, video_id, watch_date.isoformat()]))
+
+    def pop_batch(self, size):
+        pipe = self.redis.pipeline()
+        pipe.lrange(self.KEY, 0, size - 1)
+        pipe.ltrim(self.KEY, size, -1)
+        raw, _ = pipe.execute()
+        events = []
+        for item in raw:
+            user_id, video_id, watch_date = json.loads(item)
+            events.append((user_id, video_id, parse_datetime(watch_date)))
+        return events
+
+    def requeue(self, events):
+        self.redis.lpush(self.KEY, *(
+            json.dumps([user_id, video_id, watch_date.isoformat()])
+            for user_id, video_id, watch_date in reversed(events)
+        ))
+
+
+_BACKENDS = {
+    'memory': MemoryWatchQueue,
+    'redis': RedisWatchQueue,
+}
+
+
+class WatchHistoryPipeline:
+    """Queue watch events and upsert them in batches from a background flusher.
+
+    ``MAX_QUEUE_SIZE`` bounds the queue. When it is reached, ``OVERFLOW``
+    decides what happens to a new event: ``'drop'`` discards it and counts
+    it in ``watch_events_dropped_total``, ``'raise'`` raises
+    ``WatchQueueFull`` and ``'flush'`` drains a batch on the caller's
+    thread, putting a database write on the request path.
+    """
+
+    def __init__(self, config):
+        self.queue = _BACKENDS[config.get('BACKEND', 'memory')](**config.get('OPTIONS', {}))
+        self.batch_size = config.get('BATCH_SIZE', 500)
+        self.max_queue_size = config.get('MAX_QUEUE_SIZE', 50000)
+        self.overflow = config.get('OVERFLOW', 'drop')
+        self.flusher = PeriodicTask(
+            self.flush,
+            config.get('FLUSH_INTERVAL', 2),
+            name='watch-history-flush',
+            flush_on_exit=config.get('FLUSH_ON_EXIT', True),
+        )
+
+    def record(self, user_id, video_id, watch_date=None):
+        self.flusher.ensure_started()
+        if self.max_queue_size and len(self.queue) >= self.max_queue_size:
+            if self.overflow == 'drop':
+                watch_events_dropped.labels().inc()
+                logger.warning('Watch history queue full, dropping event for video %s', video_id)
+                return
+            if self.overflow == 'raise':
+                raise WatchQueueFull()
+            self.flush_batch()
+        self.queue.push((int(user_id), int(video_id), watch_date or timezone.now()))
+
+    def flush_batch(self):
+        events = self.queue.pop_batch(self.batch_size)
+        if not events:
+            return 0
+        try:
+            write_watch_events(events)
+        except Exception:
+            self.queue.requeue(events)
+            raise
+        return len(events)
+
+    def flush(self):
+        flushed = 0
+        while True:
+            count = self.flush_batch()
+            flushed += count
+            if count < self.batch_size:
+                return flushed
+
+
+watch_history_pipeline = WatchHistoryPipeline(settings.WATCH_HISTORY_PIPELINE)
+
+
+def record_watch(user_id, video_id, watch_date=None):
+    watch_history_pipeline.record(user_id, video_id, watch_date)